@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from logic import DynamicGridBacktest, calculate_opening_atr, price_arrays
+from session_calendar import SessionCalendar
+from metrics import EquityAccumulator, EQUITY_BLOCK
+from grid_kernel import NUMBA_AVAILABLE, EVENT_DTYPE, run_batch_kernel
+
+# Strategy parameters that may differ between the K backtests of a batch
+BATCH_PARAMETERS = ('grid_size_factor', 'minimum_grid_size', 'move_pivot', 'take_profit_factor')
+
+
+class BatchDynamicGridBacktest:
+    """
+    Runs the DynamicGridBacktest strategy for K parameter sets in one pass
+    over the ticks.
+
+    The K grids advance in lockstep through run_batch_kernel: price decoding,
+    session flags, the opening ATR and the rolling ATR are computed once for
+    all of them, and each grid's state (capital, pivot, grid size, positions)
+    is a row of (K,) and (K, max_positions) arrays. Every row runs the same
+    tick loop as the single-run engines, so its metrics equal those of a
+    DynamicGridBacktest with the same parameters. Only metrics are produced:
+    no trade log, trade history or equity curve is kept. Without numba the
+    parameter sets are run one after another on the "events" engine.
+    """
+    def __init__(self, parameter_sets, capital=500e6, contract_value=100e3, margin_rate=0.2, fee_per_trade=0.47,
+                 max_loss=20, session_calendar=None, verbose=False):
+        self.parameter_sets = [dict(parameters) for parameters in parameter_sets]
+        if not self.parameter_sets:
+            raise ValueError("At least one parameter set is required")
+        missing = [name for name in BATCH_PARAMETERS if any(name not in p for p in self.parameter_sets)]
+        if missing:
+            raise ValueError(f"Parameter sets are missing: {', '.join(missing)}")
+        self.capital = capital
+        self.contract_value = contract_value
+        self.margin_rate = margin_rate
+        self.fee_per_trade = fee_per_trade
+        self.max_loss = max_loss
+        self.max_contracts = 12
+        self.max_positions = 12
+        self.daily_fee_limit = 50000000
+        self.short_atr_window = 60
+        self.session_calendar = session_calendar or SessionCalendar()
+        # Progress prints per block of ticks; off by default as batches run inside optimization loops
+        self.verbose = verbose
+
+    def backtest(self, prices):
+        """
+        Run all K backtests on the given price series. Returns a list of K
+        metrics dicts (as from performance_metrics, without 'equity_series'),
+        None where a run lost all its capital.
+        """
+        if prices is None or prices.empty:
+            print("No data available for backtest.")
+            return [None] * len(self.parameter_sets)
+        if not NUMBA_AVAILABLE:
+            return self._run_sequential(prices)
+        return self._run_batch(prices)
+
+    def _run_sequential(self, prices):
+        results = []
+        for parameters in self.parameter_sets:
+            backtest = DynamicGridBacktest(
+                capital=self.capital, contract_value=self.contract_value, margin_rate=self.margin_rate,
+                fee_per_trade=self.fee_per_trade, max_loss=self.max_loss, engine="events", fast=True,
+                session_calendar=self.session_calendar, **{name: parameters[name] for name in BATCH_PARAMETERS})
+            results.append(backtest.backtest(prices))
+        return results
+
+    def _run_batch(self, prices):
+        k = len(self.parameter_sets)
+        values, epoch_ns, days, _ = price_arrays(prices)
+        trading, end_of_day, new_day, final_close = self.session_calendar.flags(prices.index)
+        opening_atr = calculate_opening_atr(prices)
+        opening_days = pd.to_datetime(opening_atr.index).values.astype("datetime64[D]").astype(np.int32)
+        opening_values = opening_atr.to_numpy(dtype=np.float64)
+        parameters = {name: np.array([float(p[name]) for p in self.parameter_sets]) for name in BATCH_PARAMETERS}
+
+        n = len(values)
+        # One spare position column for the position a pair close opens before closing it
+        capacity = self.max_positions + 1
+        sides = np.zeros((k, capacity), dtype=np.int8)
+        entries = np.zeros((k, capacity))
+        sizes = np.zeros((k, capacity))
+        position_count = np.zeros(k, dtype=np.int64)
+        net_quantity = np.zeros(k)
+        entry_notional = np.zeros(k)
+        capital = np.full(k, float(self.capital))
+        current_pivot = np.full(k, values[0])
+        has_grid = np.zeros(k, dtype=np.bool_)
+        grid_size = np.zeros(k)
+        size = np.zeros(k)
+        last_valid_atr = np.ones(k)
+        daily_atr = np.full(k, np.nan)
+        alive = np.ones(k, dtype=np.bool_)
+        opened_volume = np.zeros(k)
+        atr_buffer = np.zeros(self.short_atr_window)
+        atr_counts = np.zeros(2, dtype=np.int64)
+        atr_sums = np.array([0.0, values[0]])
+        events = np.empty(0, dtype=EVENT_DTYPE)
+
+        accumulator = EquityAccumulator(k, epoch_ns)
+        accumulator.add(capital[:, None])
+        equity = np.empty((k, EQUITY_BLOCK))
+        for start in range(1, n, EQUITY_BLOCK):
+            stop = min(start + EQUITY_BLOCK, n)
+            if self.verbose:
+                print(f"Processing {start / n * 100:.2f}%")
+            run_batch_kernel(
+                values, days, trading, end_of_day, new_day, final_close, opening_days, opening_values, start, stop,
+                equity, events, 0, alive, opened_volume, sides, entries, sizes, position_count, net_quantity,
+                entry_notional, capital, current_pivot, has_grid, grid_size, size, last_valid_atr, daily_atr,
+                atr_buffer, atr_counts, atr_sums, float(self.contract_value), float(self.fee_per_trade),
+                parameters['grid_size_factor'], parameters['minimum_grid_size'], parameters['move_pivot'],
+                float(self.max_loss), parameters['take_profit_factor'], self.max_positions,
+                float(self.max_contracts), 0.0, float(self.daily_fee_limit))
+            accumulator.add(equity[:, :stop - start])
+
+        results = []
+        for row in range(k):
+            if not alive[row]:
+                results.append(None)
+                continue
+            turnover = opened_volume[row] * self.contract_value / capital[row]
+            results.append(accumulator.metrics(row, turnover, prices.index.name))
+        return results
@@ -0,0 +1,69 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import yaml
+
+from data_fetcher import load_data_from_file
+from driver import create_backtest
+from grid_kernel import NUMBA_AVAILABLE
+
+
+def time_engine(config, prices, engine, log_dir):
+    """
+    Run one backtest with the given engine and return the elapsed seconds
+    """
+    engine_config = dict(config, backtest=dict(config.get('backtest', {}), engine=engine))
+    backtest = create_backtest(engine_config)
+    backtest.log_file = os.path.join(log_dir, f"trade_log_{engine}.txt")
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        backtest.backtest(prices)
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main():
+    """
+    Compare backtest engine throughput in ticks/second
+    """
+    parser = argparse.ArgumentParser(description='Grid Trading Backtest Engine Benchmark')
+    parser.add_argument('--data', type=str, default='data/sample/vn30_2024.csv',
+                       help='Price file to run the backtest on')
+    parser.add_argument('--config', type=str, default='config/config.yaml',
+                       help='Path to config file (strategy parameters)')
+    parser.add_argument('--engines', type=str, nargs='+', default=['pandas', 'numpy', 'events', 'numba'],
+                       choices=['pandas', 'numpy', 'events', 'numba'], help='Engines to benchmark')
+    
+    args = parser.parse_args()
+    
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    
+    prices = load_data_from_file(args.data)
+    if prices is None:
+        return
+    
+    engines = args.engines
+    if 'numba' in engines and not NUMBA_AVAILABLE:
+        print("numba is not installed, skipping the numba engine.")
+        engines = [engine for engine in engines if engine != 'numba']
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        if 'numba' in engines:
+            # Compile outside of the timed run
+            time_engine(config, prices.iloc[:5000], 'numba', log_dir)
+        
+        results = {engine: time_engine(config, prices, engine, log_dir) for engine in engines}
+    
+    reference = results.get('pandas')
+    print(f"\n{'Engine':<10}{'Ticks':>12}{'Seconds':>12}{'Ticks/s':>14}{'Speedup':>10}")
+    for engine, elapsed in results.items():
+        speedup = f"{reference / elapsed:.1f}x" if reference else "-"
+        print(f"{engine:<10}{len(prices):>12,}{elapsed:>12.2f}{len(prices) / elapsed:>14,.0f}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
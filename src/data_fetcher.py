@@ -1,8 +1,15 @@
 import pandas as pd
 import numpy as np
 import os
+import json
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import psycopg
+from psycopg.conninfo import make_conninfo
 from dotenv import load_dotenv
+from tick_store import TickStore
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,7 +26,33 @@ def load_query_from_file(filepath="data/query.txt"):
         print(f"Error loading query from {filepath}: {e}")
         return None
 
-def fetch_vn30_data(query=None):
+FETCH_BATCH_SIZE = 50000
+
+def bounded_query(query):
+    """
+    Restrict a (datetime, price) query to the rows between the %(start)s and
+    %(end)s bind parameters, unless it already filters on them itself
+    """
+    query = query.strip().rstrip(';')
+    if "%(start)s" in query or "%(end)s" in query:
+        return query
+    # A CTE column list renames whatever the query calls its two columns
+    return (f"WITH source (datetime, price) AS ({query}) SELECT datetime, price FROM source "
+            "WHERE datetime >= %(start)s AND datetime <= %(end)s ORDER BY datetime")
+
+def db_connection_kwargs():
+    """
+    PostgreSQL connection settings from the DB_* environment variables
+    """
+    return {
+        'host': os.getenv('DB_HOST'),
+        'port': int(os.getenv('DB_PORT')),  # Convert port to integer
+        'dbname': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+    }
+
+def fetch_vn30_data(query=None, start_date=None, end_date=None, batch_size=FETCH_BATCH_SIZE, method="cursor"):
     """
     Fetch VN30F futures data from the database
     
@@ -27,6 +60,14 @@ def fetch_vn30_data(query=None):
     ----------
     query : str, optional
         SQL query to execute. If None, the query will be loaded from data/query.txt
+    start_date, end_date : datetime-like, optional
+        Inclusive bounds passed to the database as bind parameters, so only the
+        requested window is transferred
+    batch_size : int
+        Number of rows read per round trip from the server-side cursor
+    method : str
+        "cursor" to stream rows through a named cursor, or "copy" to transfer
+        them with COPY ... (FORMAT BINARY) and decode the result in NumPy
     """
     print("Fetching data from database...")
     try:
@@ -37,26 +78,242 @@ def fetch_vn30_data(query=None):
                 print("Failed to load query from file.")
                 return None
         
-        with psycopg.connect(
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT')),  # Convert port to integer
-            dbname=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        ) as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                result = cur.fetchall()
-                
-                if not result:
-                    print("Query returned no results.")
-                    return None
-                    
-                timestamps = [row[0] for row in result]
-                prices = [float(row[1]) for row in result]
-                df = pd.Series(prices, index=pd.to_datetime(timestamps))
-                print(f"Successfully fetched {len(df)} data points.")
-                return df
+        params = None
+        if start_date is not None or end_date is not None:
+            query = bounded_query(query)
+            params = {
+                'start': pd.Timestamp(start_date).to_pydatetime() if start_date is not None else datetime.min,
+                'end': pd.Timestamp(end_date).to_pydatetime() if end_date is not None else datetime.max,
+            }
+        
+        started = time.perf_counter()
+        with psycopg.connect(**db_connection_kwargs()) as conn:
+            timestamps, prices = fetch_price_arrays(conn, query, params, batch_size, method)
+        
+        elapsed = time.perf_counter() - started
+        index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), copy=False)
+        df = pd.Series(prices, index=index, copy=False)
+        if df.empty:
+            # An empty Series, unlike None, tells callers the range holds no ticks
+            print("Query returned no results.")
+            return df
+        print(f"Successfully fetched {len(df)} data points in {elapsed:.2f}s "
+              f"({len(df) / max(elapsed, 1e-9):,.0f} rows/s).")
+        return df
+    except Exception as e:
+        print(f"Error fetching data: {e}")
+        return None
+
+def fetch_price_arrays(conn, query, params=None, batch_size=FETCH_BATCH_SIZE, method="cursor"):
+    """
+    Run a (datetime, price) query on a psycopg connection and return int64
+    epoch-ns timestamps and float64 prices, using the given fetch method
+    """
+    if method == "copy":
+        return copy_price_arrays(conn, query, params)
+    if method != "cursor":
+        raise ValueError(f"Unknown fetch method: {method}")
+    # A named cursor keeps the result set on the server; rows arrive batch_size at a time
+    with conn.cursor(name="vn30_fetch") as cur:
+        cur.itersize = batch_size
+        cur.execute(query, params)
+        return read_price_batches(cur, batch_size)
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# Layout of one COPY binary tuple of a non-null timestamp and float8
+COPY_ROW_DTYPE = np.dtype([
+    ('fields', '>i2'),
+    ('timestamp_length', '>i4'),
+    ('timestamp', '>i8'),
+    ('price_length', '>i4'),
+    ('price', '>f8'),
+])
+# PostgreSQL timestamps count microseconds from 2000-01-01
+POSTGRES_EPOCH_NS = pd.Timestamp("2000-01-01").value
+
+def copy_price_arrays(conn, query, params=None):
+    """
+    Transfer a (datetime, price) query with COPY ... TO STDOUT (FORMAT BINARY),
+    cast to fixed-width timestamp/float8 columns, and decode it with NumPy
+    """
+    query = query.strip().rstrip(';')
+    copy_statement = (f"COPY (WITH ticks (datetime, price) AS ({query}) "
+                      "SELECT datetime::timestamp, price::float8 FROM ticks "
+                      "WHERE datetime IS NOT NULL AND price IS NOT NULL ORDER BY datetime) "
+                      "TO STDOUT (FORMAT BINARY)")
+    buffer = bytearray()
+    with conn.cursor() as cur:
+        # COPY cannot take server-side parameters; psycopg binds params client-side here
+        with cur.copy(copy_statement, params) as copy:
+            for block in copy:
+                buffer += block
+    return decode_copy_binary(buffer)
+
+def decode_copy_binary(buffer):
+    """
+    Decode a PostgreSQL binary COPY stream of (timestamp, float8) rows into
+    int64 epoch-ns timestamps and float64 prices without a per-row loop
+    """
+    data = memoryview(buffer)
+    if bytes(data[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+        raise ValueError("Not a binary COPY stream")
+    # Signature, 32-bit flags, then a 32-bit header extension length and the extension itself
+    extension_length = int.from_bytes(data[15:19], "big")
+    body = data[19 + extension_length:]
+    if bytes(body[-2:]) != b"\xff\xff":
+        raise ValueError("Binary COPY stream is truncated")
+    body = body[:-2]
+    if len(body) % COPY_ROW_DTYPE.itemsize:
+        raise ValueError("Unexpected binary COPY row layout")
+    rows = np.frombuffer(body, dtype=COPY_ROW_DTYPE)
+    if not ((rows['fields'] == 2).all() and (rows['timestamp_length'] == 8).all()
+            and (rows['price_length'] == 8).all()):
+        raise ValueError("Unexpected binary COPY row layout")
+    timestamps = rows['timestamp'].astype(np.int64) * 1000 + POSTGRES_EPOCH_NS
+    prices = rows['price'].astype(np.float64)
+    return timestamps, prices
+
+def read_price_batches(cur, batch_size=FETCH_BATCH_SIZE):
+    """
+    Drain a cursor of (datetime, price) rows into int64 epoch-ns timestamps
+    and float64 prices, batch by batch into arrays that double when full
+    """
+    capacity = batch_size
+    timestamps = np.empty(capacity, dtype=np.int64)
+    prices = np.empty(capacity, dtype=np.float64)
+    count = 0
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        if count + len(rows) > capacity:
+            while capacity < count + len(rows):
+                capacity *= 2
+            timestamps = np.resize(timestamps, capacity)
+            prices = np.resize(prices, capacity)
+        batch_timestamps, batch_prices = zip(*rows)
+        stamps = pd.DatetimeIndex(batch_timestamps)
+        if stamps.tz is not None:
+            # Keep exchange wall-clock times, as the session filters expect naive timestamps
+            stamps = stamps.tz_localize(None)
+        timestamps[count:count + len(rows)] = stamps.values.astype("datetime64[ns]").view(np.int64)
+        prices[count:count + len(rows)] = np.asarray(batch_prices, dtype=np.float64)
+        count += len(rows)
+    return timestamps[:count], prices[:count]
+
+class PostgresTickPool:
+    """
+    psycopg_pool.ConnectionPool of up to max_size connections; each fetch
+    borrows one connection and reads its rows with the given fetch method
+    """
+    def __init__(self, max_size=4, method="cursor"):
+        from psycopg_pool import ConnectionPool
+        self.pool = ConnectionPool(make_conninfo(**db_connection_kwargs()), min_size=1, max_size=max_size, open=True)
+        self.method = method
+
+    def fetch(self, query, params, batch_size=FETCH_BATCH_SIZE):
+        with self.pool.connection() as conn:
+            return fetch_price_arrays(conn, query, params, batch_size, self.method)
+
+    def close(self):
+        self.pool.close()
+
+class SQLiteTickPool:
+    """
+    Stand-in for PostgresTickPool over a local SQLite file (DB_SQLITE_FILE),
+    for running the loader without a database server. Timestamps are stored
+    as ISO text; each fetch opens its own connection.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, query, params, batch_size=FETCH_BATCH_SIZE):
+        import sqlite3
+        # sqlite3 spells named parameters :name and compares timestamps as text
+        query = query.replace("%(start)s", ":start").replace("%(end)s", ":end")
+        params = {key: str(value) for key, value in (params or {}).items()}
+        with closing(sqlite3.connect(self.path)) as conn:
+            cur = conn.execute(query, params)
+            return read_price_batches(cur, batch_size)
+
+    def close(self):
+        pass
+
+def create_tick_pool(max_size=4, method="cursor"):
+    """
+    Connection pool for the pooled loader: SQLite when DB_SQLITE_FILE is set,
+    PostgreSQL from the DB_* settings otherwise
+    """
+    sqlite_file = os.getenv('DB_SQLITE_FILE')
+    if sqlite_file:
+        return SQLiteTickPool(sqlite_file)
+    return PostgresTickPool(max_size, method)
+
+def month_chunks(start_date, end_date):
+    """
+    Split the inclusive range [start_date, end_date] at month boundaries into
+    inclusive (start, end) pairs that do not overlap
+    """
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    boundaries = pd.date_range(start_date.normalize() + pd.offsets.MonthBegin(1), end_date, freq="MS")
+    starts = [start_date] + list(boundaries)
+    # Database timestamps have microsecond resolution, so this end excludes the next chunk's first instant
+    ends = [boundary - pd.Timedelta(microseconds=1) for boundary in boundaries] + [end_date]
+    return list(zip(starts, ends))
+
+def fetch_vn30_data_pooled(start_date, end_date, query=None, workers=4, batch_size=FETCH_BATCH_SIZE, pool=None,
+                           method="cursor"):
+    """
+    Fetch VN30F futures data between start_date and end_date (inclusive) as
+    per-month chunks fetched concurrently over a connection pool, stitched
+    back together in date order
+
+    Parameters:
+    ----------
+    workers : int
+        Number of chunks fetched at the same time (and pooled connections)
+    pool : optional
+        Pool to fetch through; by default one from create_tick_pool is
+        opened and closed around the fetch
+    """
+    print("Fetching data from database...")
+    own_pool = pool is None
+    try:
+        if query is None:
+            query = load_query_from_file()
+            if query is None:
+                print("Failed to load query from file.")
+                return None
+        query = bounded_query(query)
+        chunks = month_chunks(start_date, end_date)
+        
+        started = time.perf_counter()
+        if own_pool:
+            pool = create_tick_pool(workers, method)
+        try:
+            def fetch_chunk(chunk):
+                params = {'start': chunk[0].to_pydatetime(), 'end': chunk[1].to_pydatetime()}
+                return pool.fetch(query, params, batch_size)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map returns results in submission order, i.e. month by month
+                results = list(executor.map(fetch_chunk, chunks))
+        finally:
+            if own_pool:
+                pool.close()
+        
+        timestamps = np.concatenate([chunk_timestamps for chunk_timestamps, _ in results])
+        prices = np.concatenate([chunk_prices for _, chunk_prices in results])
+        elapsed = time.perf_counter() - started
+        index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), copy=False)
+        df = pd.Series(prices, index=index, copy=False)
+        if df.empty:
+            # An empty Series, unlike None, tells callers the range holds no ticks
+            print("Query returned no results.")
+            return df
+        print(f"Successfully fetched {len(df)} data points in {len(chunks)} chunks in {elapsed:.2f}s "
+              f"({len(df) / max(elapsed, 1e-9):,.0f} rows/s).")
+        return df
     except Exception as e:
         print(f"Error fetching data: {e}")
         return None
@@ -75,13 +332,97 @@ def save_data_to_file(data, filename="data/vn30_data.csv"):
         print(f"Error saving data to {filename}: {e}")
         return False
 
-def load_data_from_file(filename="data/vn30_data.csv"):
+PRICE_CACHE_VERSION = 1
+
+def price_cache_paths(filename):
+    """
+    Paths of the binary sidecar files caching the given price file
+    """
+    cache_dir = os.path.join(os.path.dirname(filename) or '.', ".price_cache")
+    base = os.path.join(cache_dir, os.path.basename(filename))
+    return {
+        'meta': base + ".json",
+        'timestamps': base + ".timestamps.npy",
+        'values': base + ".values.npy",
+    }
+
+def price_cache_key(filename):
     """
-    Load time series data from a CSV file
+    Identify the current contents of a price file by path, size and mtime
+    """
+    stat = os.stat(filename)
+    return {
+        'version': PRICE_CACHE_VERSION,
+        'source': os.path.abspath(filename),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+def load_price_cache(filename):
+    """
+    Memory-map the cached prices of a file, or return None if there is no
+    cache or it no longer matches the file
+    """
+    paths = price_cache_paths(filename)
+    try:
+        with open(paths['meta'], 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('key') != price_cache_key(filename):
+        return None
+    try:
+        timestamps = np.load(paths['timestamps'], mmap_mode='r')
+        values = np.load(paths['values'], mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), name=meta.get('index_name'), copy=False)
+    return pd.Series(values, index=index, name=meta.get('name'), copy=False)
+
+def save_price_cache(filename, data):
+    """
+    Write the int64 ns timestamps and float64 prices of data as .npy sidecars of filename
+    """
+    paths = price_cache_paths(filename)
+    try:
+        os.makedirs(os.path.dirname(paths['meta']), exist_ok=True)
+        arrays = {
+            'timestamps': data.index.values.astype("datetime64[ns]").view(np.int64),
+            'values': data.to_numpy(dtype=np.float64),
+        }
+        for key, array in arrays.items():
+            # np.save appends .npy to names without it, so keep the suffix on the temporary file
+            temporary = paths[key][:-len(".npy")] + ".tmp.npy"
+            np.save(temporary, array)
+            os.replace(temporary, paths[key])
+        # The metadata is written last, so a partially written cache is never considered valid
+        meta = {
+            'key': price_cache_key(filename),
+            'name': data.name,
+            'index_name': data.index.name,
+        }
+        with open(paths['meta'] + ".tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(paths['meta'] + ".tmp", paths['meta'])
+    except Exception as e:
+        print(f"Error writing price cache for {filename}: {e}")
+
+def load_data_from_file(filename="data/vn30_data.csv", use_cache=True, rebuild_cache=False):
+    """
+    Load time series data from a CSV file, through a memory-mapped binary
+    cache that is (re)built whenever it is missing, stale or rebuild_cache is set
     """
     try:
         if os.path.exists(filename):
-            data = pd.read_csv(filename, index_col=0, parse_dates=True).squeeze("columns")
+            data = None
+            if use_cache and not rebuild_cache:
+                data = load_price_cache(filename)
+                if data is not None:
+                    print(f"Using price cache for {filename}.")
+            if data is None:
+                data = pd.read_csv(filename, index_col=0, parse_dates=True).squeeze("columns")
+                if use_cache and not data.empty:
+                    save_price_cache(filename, data)
             if data.empty:
                 print(f"File {filename} exists but contains no data.")
                 return None
@@ -94,7 +435,46 @@ def load_data_from_file(filename="data/vn30_data.csv"):
         print(f"Error loading data from {filename}: {e}")
         return None
 
-def prepare_data(config, mode="in_sample"):
+def fetch_prices(config, start_date, end_date):
+    """
+    Fetch the inclusive date range from the database with the loader the
+    data config selects
+    """
+    batch_size = config['data'].get('fetch_batch_size', FETCH_BATCH_SIZE)
+    fetch_workers = config['data'].get('fetch_workers', 1)
+    method = config['data'].get('fetch_method', 'cursor')
+    if fetch_workers > 1 or os.getenv('DB_SQLITE_FILE'):
+        return fetch_vn30_data_pooled(start_date, end_date, workers=fetch_workers, batch_size=batch_size,
+                                      method=method)
+    return fetch_vn30_data(start_date=start_date, end_date=end_date, batch_size=batch_size, method=method)
+
+def refresh_tick_store(config, tick_store_dir, start_date, end_date):
+    """
+    Fetch only the parts of [start_date, end_date] missing from the tick
+    store, add them to it, and return the stored ticks for the whole range
+    """
+    try:
+        store = TickStore(tick_store_dir)
+        # Nothing can exist after now; leaving that part uncovered lets the next run pick it up
+        gaps = store.missing_ranges(start_date, min(end_date, pd.Timestamp.now()))
+        if gaps:
+            print(f"Tick store {tick_store_dir} is missing {len(gaps)} range(s), fetching them...")
+        for gap_start, gap_end in gaps:
+            fetched = fetch_prices(config, gap_start, gap_end)
+            if fetched is None:
+                print(f"Fetching {gap_start} to {gap_end} failed; it will be retried on the next run.")
+                continue
+            # Empty ranges are recorded too, so weekends and holidays are not queried again
+            store.add(fetched, gap_start, gap_end)
+        prices = store.load(start_date, end_date)
+        if prices is not None:
+            print(f"Data loaded from tick store {tick_store_dir}: {len(prices)} data points.")
+        return prices
+    except Exception as e:
+        print(f"Error using tick store {tick_store_dir}: {e}")
+        return None
+
+def prepare_data(config, mode="in_sample", rebuild_cache=False):
     """
     Prepare data for either in-sample or out-sample based on config
     """
@@ -108,22 +488,29 @@ def prepare_data(config, mode="in_sample"):
         end_date = pd.to_datetime(config['data']['out_sample']['end_date'])
     
     prices = None
+    use_cache = config['data'].get('price_cache', True)
     
     # Try to fetch data if configured
     if config['data']['fetch_data']:
-        prices = fetch_vn30_data()
+        tick_store_dir = config['data'].get('tick_store')
+        if tick_store_dir:
+            prices = refresh_tick_store(config, tick_store_dir, start_date, end_date)
+        else:
+            prices = fetch_prices(config, start_date, end_date)
+        if prices is not None and prices.empty:
+            prices = None
         if prices is not None and config['data']['save_fetched_data']:
             # Always save fetched data to "data/vn30_data.csv" instead of file_path
             save_data_to_file(prices, "data/vn30_data.csv")
     
     # If fetching failed or wasn't configured, try to load from file
     if prices is None:
-        prices = load_data_from_file(file_path)
+        prices = load_data_from_file(file_path, use_cache, rebuild_cache)
         
         # If specified file doesn't exist, try the default file as fallback
         if prices is None and file_path != "data/vn30_data.csv":
             print(f"Trying to load from default file data/vn30_data.csv as fallback...")
-            prices = load_data_from_file("data/vn30_data.csv")
+            prices = load_data_from_file("data/vn30_data.csv", use_cache, rebuild_cache)
 
     # Filter by date range if we have data
     if prices is not None:
@@ -3,13 +3,31 @@ import yaml
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
 import optuna
 import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from data_fetcher import prepare_data
+from shared_data import share_prices, attach_prices
 from logic import DynamicGridBacktest
+from batch_backtest import BatchDynamicGridBacktest
+from result_cache import TrialCache
+from metrics import close_to_close_returns, annualized_sharpe
+from session_calendar import SessionCalendar
+from plotting import wait_for_plots
+
+
+# Optimized strategy parameters: name, default search range and step (None for integers)
+SEARCH_SPACE = (
+    ('grid_size_factor', [1.0, 10.0], 0.25),
+    ('minimum_grid_size', [0.6, 2.0], 0.1),
+    ('move_pivot', [6, 12], None),
+    ('take_profit_factor', [1, 2], 0.5),
+)
+# Scalar metrics written for every parameter set to the grid search results table
+GRIDSEARCH_METRICS = ('hpr', 'annual_return', 'max_drawdown', 'longest_drawdown', 'turnover_ratio', 'sharpe_ratio',
+                      'sortino_ratio', 'final_capital')
 
 
 def setup_results_dir(config, run_mode):
@@ -30,12 +48,44 @@ def setup_results_dir(config, run_mode):
     return output_dir
 
 
-def run_backtest(config, data_mode, output_dir):
+def create_backtest(config, params=None, trade_log=None, fast=False):
+    """
+    Create a backtest instance from the strategy and engine settings in config,
+    with params overriding the strategy parameters and trade_log overriding
+    the configured trade log sink. fast backtests only compute metrics.
+    """
+    strategy = dict(config['strategy'])
+    if params:
+        strategy.update(params)
+    backtest_config = config.get('backtest', {})
+    
+    return DynamicGridBacktest(
+        capital=strategy['capital'],
+        contract_value=strategy['contract_value'],
+        margin_rate=strategy['margin_rate'],
+        fee_per_trade=strategy['fee_per_trade'],
+        grid_size_factor=strategy['grid_size_factor'],
+        minimum_grid_size=strategy['minimum_grid_size'],
+        move_pivot=strategy['move_pivot'],
+        # max_loss=strategy['max_loss'],
+        take_profit_factor=strategy['take_profit_factor'],
+        engine=backtest_config.get('engine', 'pandas'),
+        trade_log=trade_log or backtest_config.get('trade_log', 'text'),
+        trade_log_buffer=backtest_config.get('trade_log_buffer', 1000),
+        session_calendar=SessionCalendar.from_config(config),
+        equity_resolution=backtest_config.get('equity_resolution', 'tick'),
+        plot=config['results'].get('plot', 'sync'),
+        plot_points=config['results'].get('plot_points', 3000),
+        fast=fast
+    )
+
+
+def run_backtest(config, data_mode, output_dir, rebuild_cache=False):
     """
     Run a backtest using the specified configuration and data mode
     """
     # Prepare data
-    prices = prepare_data(config, data_mode)
+    prices = prepare_data(config, data_mode, rebuild_cache)
     
     if prices is None:
         print(f"Error: Failed to load {data_mode} data.")
@@ -44,17 +94,7 @@ def run_backtest(config, data_mode, output_dir):
     print(f"Running backtest on {data_mode} data with {len(prices)} price points...")
     
     # Create backtest instance with parameters from config
-    backtest = DynamicGridBacktest(
-        capital=config['strategy']['capital'],
-        contract_value=config['strategy']['contract_value'],
-        margin_rate=config['strategy']['margin_rate'],
-        fee_per_trade=config['strategy']['fee_per_trade'],
-        grid_size_factor=config['strategy']['grid_size_factor'],
-        minimum_grid_size=config['strategy']['minimum_grid_size'],
-        move_pivot=config['strategy']['move_pivot'],
-        # max_loss=config['strategy']['max_loss'],
-        take_profit_factor=config['strategy']['take_profit_factor']
-    )
+    backtest = create_backtest(config)
     
     # Run backtest
     backtest.log_file = os.path.join(output_dir, f"trade_log.txt")
@@ -62,72 +102,196 @@ def run_backtest(config, data_mode, output_dir):
     
     # Print and save results
     print(f"\nBacktest results ({data_mode}):")
-    backtest.print_results(output_dir)
+    backtest.print_results(output_dir, metrics)
     
     return metrics
 
 
-def objective(trial, config, prices):
+def search_ranges(config):
     """
-    Objective function for Optuna optimization
+    (name, low, high, step) of every optimized parameter, with the ranges
+    from the optimization section of config; step is None for integers
     """
-    # Get parameter ranges from config or use defaults
     opt_config = config.get('optimization', {})
-    
-    grid_size_factor_range = opt_config.get('grid_size_factor_range', [1.0, 10.0])
-    minimum_grid_size_range = opt_config.get('minimum_grid_size_range', [0.6, 2.0])
-    move_pivot_range = opt_config.get('move_pivot_range', [6, 12])
-    take_profit_factor_range = opt_config.get('take_profit_factor_range', [1, 2])
-    
-    # Sample parameters
-    grid_size_factor = trial.suggest_float("grid_size_factor", 
-                                          grid_size_factor_range[0], 
-                                          grid_size_factor_range[1], 
-                                          step=0.25)
-    
-    minimum_grid_size = trial.suggest_float("minimum_grid_size", 
-                                           minimum_grid_size_range[0], 
-                                           minimum_grid_size_range[1], 
-                                           step=0.1)
-    
-    move_pivot = trial.suggest_int("move_pivot", 
-                                  move_pivot_range[0], 
-                                  move_pivot_range[1])
-    
-    take_profit_factor = trial.suggest_float("take_profit_factor", 
-                                            take_profit_factor_range[0], 
-                                            take_profit_factor_range[1], 
-                                            step=0.5)
-    
-    # Create backtest instance with trial parameters
-    backtest = DynamicGridBacktest(
-        capital=config['strategy']['capital'],
-        contract_value=config['strategy']['contract_value'],
-        margin_rate=config['strategy']['margin_rate'],
-        fee_per_trade=config['strategy']['fee_per_trade'],
-        grid_size_factor=grid_size_factor,
-        minimum_grid_size=minimum_grid_size,
-        move_pivot=move_pivot,
-        # max_loss=config['strategy']['max_loss'],
-        take_profit_factor=take_profit_factor
-    )
-    
-    # Run backtest
-    metrics = backtest.backtest(prices)
-    
+    return [(name, *opt_config.get(f"{name}_range", default), step) for name, default, step in SEARCH_SPACE]
+
+
+def suggest_parameters(trial, config):
+    """
+    Sample the strategy parameters of a trial from the configured search ranges
+    """
+    parameters = {}
+    for name, low, high, step in search_ranges(config):
+        if step is None:
+            parameters[name] = trial.suggest_int(name, low, high)
+        else:
+            parameters[name] = trial.suggest_float(name, low, high, step=step)
+    return parameters
+
+
+def parameter_lattice(config):
+    """
+    Every point of the discrete search space that suggest_parameters samples
+    from, as a DataFrame with one column per parameter
+    """
+    axes = {}
+    for name, low, high, step in search_ranges(config):
+        if step is None:
+            axes[name] = np.arange(int(low), int(high) + 1)
+        else:
+            # Same grid as Optuna's stepped floats, rounded to drop floating point noise
+            count = int(np.floor((high - low) / step + 1e-9)) + 1
+            axes[name] = np.round(low + step * np.arange(count), 10)
+    mesh = np.meshgrid(*axes.values(), indexing='ij')
+    return pd.DataFrame({name: values.ravel() for name, values in zip(axes, mesh)})
+
+
+def objective_value(metrics):
+    """
+    Sharpe ratio of a backtest's metrics, or -inf for a failed or bankrupt run
+    """
     if metrics is None or 'sharpe_ratio' not in metrics or 'final_capital' not in metrics:
         return -float('inf')
+    if metrics['final_capital'] < 0:
+        return -float('inf')
+    return metrics['sharpe_ratio']
+
+
+def score_trial(trial, metrics):
+    """
+    Objective value of a trial's backtest metrics, recording its scalar metrics on the trial
+    """
+    value = objective_value(metrics)
+    if value == -float('inf'):
+        return value
     
     final_capital = metrics['final_capital']
-    sharpe_ratio = metrics['sharpe_ratio']
-
-    if final_capital < 0:
-        return -float('inf')
     
-    trial.set_user_attr('final_capital', final_capital)
-    trial.set_user_attr('metrics', metrics)
+    # Only scalars, so the attributes can be kept in persistent (shared) study storage
+    trial.set_user_attr('final_capital', float(final_capital))
+    trial.set_user_attr('metrics', {key: float(metric) for key, metric in metrics.items() if np.isscalar(metric)})
+    
+    return value
+
+
+def objective(trial, config, prices, cache=None):
+    """
+    Objective function for Optuna optimization, served from cache (a
+    TrialCache) when the parameters have been run before
+    """
+    params = suggest_parameters(trial, config)
+    metrics = cache.get(params) if cache else None
+    if metrics is not None:
+        trial.set_user_attr('cached', True)
+    else:
+        # Create backtest instance with trial parameters
+        backtest = create_backtest(config, params, fast=True)
+        
+        # Run backtest, reporting daily progress to the pruner if there is one
+        progress = pruning_progress(trial) if pruning_enabled(config) else None
+        metrics = backtest.backtest(prices, progress)
+        if cache:
+            cache.put(params, metrics)
     
-    return sharpe_ratio
+    return score_trial(trial, metrics)
+
+
+def pruning_enabled(config):
+    return config.get('optimization', {}).get('pruner', 'none') != 'none'
+
+
+def create_pruner(config):
+    """
+    Optuna pruner from optimization.pruner: "none", "median" or "hyperband"
+    """
+    opt_config = config.get('optimization', {})
+    name = opt_config.get('pruner', 'none')
+    warmup_days = opt_config.get('pruner_warmup_days', 10)
+    if name == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=opt_config.get('pruner_startup_trials', 5),
+                                           n_warmup_steps=warmup_days)
+    if name == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=max(warmup_days, 1))
+    if name == 'none':
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Unknown pruner: {name}")
+
+
+def pruning_progress(trial):
+    """
+    Progress hook for DynamicGridBacktest.backtest that reports the Sharpe
+    ratio of the daily closes so far to trial, step being the number of
+    dates run, and prunes the trial when its pruner says so
+    """
+    days = []
+    closes = []
+    
+    def progress(date, equity):
+        days.append(date.toordinal())
+        closes.append(equity)
+        _, returns = close_to_close_returns(np.array(days), np.array(closes))
+        if len(returns) < 2:
+            return
+        trial.report(annualized_sharpe(returns), len(days))
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+    
+    return progress
+
+
+def create_trial_cache(config, prices):
+    """
+    TrialCache for prices at optimization.result_cache, or None if the cache is disabled
+    """
+    path = config.get('optimization', {}).get('result_cache')
+    if not path:
+        return None
+    searched = [name for name, _, _ in SEARCH_SPACE]
+    settings = {
+        'strategy': {key: value for key, value in config['strategy'].items() if key not in searched},
+        'session': config.get('session'),
+    }
+    return TrialCache(path, prices, settings)
+
+
+def create_batch_backtest(config, parameter_sets):
+    """
+    Create a batched backtest of several strategy parameter sets from the settings in config
+    """
+    strategy = config['strategy']
+    return BatchDynamicGridBacktest(
+        parameter_sets,
+        capital=strategy['capital'],
+        contract_value=strategy['contract_value'],
+        margin_rate=strategy['margin_rate'],
+        fee_per_trade=strategy['fee_per_trade'],
+        session_calendar=SessionCalendar.from_config(config)
+    )
+
+
+def run_trial_batches(study, config, prices, n_trials, batch_size, callback, cache=None):
+    """
+    Run n_trials of study batch_size at a time: ask for a batch of trials,
+    evaluate the parameters not in cache in one BatchDynamicGridBacktest
+    pass and tell the study the results
+    """
+    for first in range(0, n_trials, batch_size):
+        trials = [study.ask() for _ in range(min(batch_size, n_trials - first))]
+        parameter_sets = [suggest_parameters(trial, config) for trial in trials]
+        results = [cache.get(params) if cache else None for params in parameter_sets]
+        for trial, metrics in zip(trials, results):
+            if metrics is not None:
+                trial.set_user_attr('cached', True)
+        misses = [i for i, metrics in enumerate(results) if metrics is None]
+        if misses:
+            computed = create_batch_backtest(config, [parameter_sets[i] for i in misses]).backtest(prices)
+            for i, metrics in zip(misses, computed):
+                results[i] = metrics
+                if cache:
+                    cache.put(parameter_sets[i], metrics)
+        for trial, metrics in zip(trials, results):
+            frozen_trial = study.tell(trial, score_trial(trial, metrics))
+            callback(study, frozen_trial)
 
 
 def log_trial_callback(study, trial, output_dir):
@@ -139,6 +303,15 @@ def log_trial_callback(study, trial, output_dir):
     
     with open(log_file, "a") as f:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if trial.state == optuna.trial.TrialState.PRUNED:
+            trial_info = (
+                f"[{timestamp}] Trial {trial.number} pruned after {trial.last_step} days "
+                f"with Sharpe Ratio: {trial.intermediate_values[trial.last_step]:.2f} "
+                f"and parameters: {trial.params}."
+            )
+            f.write(trial_info + "\n")
+            print(trial_info)
+            return
         trial_info = (
             f"[{timestamp}] Trial {trial.number} finished with Sharpe Ratio: {trial.value:.2f}, "
             f"Final Capital: {final_capital:,.0f} VND "
@@ -149,12 +322,79 @@ def log_trial_callback(study, trial, output_dir):
     print(trial_info)
 
 
-def run_optimization(config, output_dir):
+def create_study_storage(output_dir):
+    """
+    Create a journal-file Optuna storage in output_dir that several processes can share
+    """
+    path = os.path.join(output_dir, "optuna_study.log")
+    try:
+        from optuna.storages.journal import JournalFileBackend
+        backend = JournalFileBackend(path)
+    except ImportError:
+        backend = optuna.storages.JournalFileStorage(path)
+    return optuna.storages.JournalStorage(backend)
+
+
+def run_trials(study, config, prices, n_trials, callback, cache=None):
+    """
+    Run n_trials of study, in batches if optimization.batch_size is above 1
+    """
+    batch_size = config.get('optimization', {}).get('batch_size', 1)
+    if batch_size > 1:
+        if pruning_enabled(config):
+            print("Warning: Trials run in batches are not pruned; set batch_size to 1 to use the pruner.")
+        run_trial_batches(study, config, prices, n_trials, batch_size, callback, cache)
+    else:
+        study.optimize(
+            lambda trial: objective(trial, config, prices, cache),
+            n_trials=n_trials,
+            callbacks=[callback]
+        )
+
+
+def optimize_worker(config, output_dir, study_name, price_spec, n_trials, cache=None):
+    """
+    Run n_trials of a shared study in a worker process, on prices attached from shared memory
+    """
+    prices, blocks = attach_prices(price_spec)
+    try:
+        study = optuna.load_study(study_name=study_name, storage=create_study_storage(output_dir),
+                                  pruner=create_pruner(config))
+        callback = lambda study, trial: log_trial_callback(study, trial, output_dir)
+        run_trials(study, config, prices, n_trials, callback, cache)
+    finally:
+        del prices
+        for block in blocks:
+            block.close()
+
+
+def run_parallel_trials(config, output_dir, prices, n_trials, workers, cache=None):
+    """
+    Split n_trials across worker processes sharing one study and one copy of the price data
+    """
+    study = optuna.create_study(direction="maximize", study_name="grid_optimization",
+                                storage=create_study_storage(output_dir), pruner=create_pruner(config))
+    blocks, price_spec = share_prices(prices)
+    try:
+        trials_per_worker = [n_trials // workers + (1 if i < n_trials % workers else 0) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(optimize_worker, config, output_dir, study.study_name, price_spec, count, cache)
+                       for count in trials_per_worker if count > 0]
+            for future in futures:
+                future.result()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return study
+
+
+def run_optimization(config, output_dir, workers=1, rebuild_cache=False):
     """
     Run parameter optimization using Optuna
     """
     # Prepare in-sample data for optimization
-    prices = prepare_data(config, "in_sample")
+    prices = prepare_data(config, "in_sample", rebuild_cache)
     
     if prices is None:
         print("Error: Failed to load in-sample data for optimization.")
@@ -162,19 +402,21 @@ def run_optimization(config, output_dir):
     
     print(f"Running optimization on in-sample data with {len(prices)} price points...")
     
-    # Create callback with output_dir
-    callback = lambda study, trial: log_trial_callback(study, trial, output_dir)
-    
-    # Create and configure the study
-    study = optuna.create_study(direction="maximize")
     n_trials = config.get('optimization', {}).get('n_trials', 100)
-    
-    # Run optimization
-    study.optimize(
-        lambda trial: objective(trial, config, prices), 
-        n_trials=n_trials, 
-        callbacks=[callback]
-    )
+    cache = create_trial_cache(config, prices)
+    
+    if workers > 1:
+        print(f"Running {n_trials} trials across {workers} worker processes...")
+        study = run_parallel_trials(config, output_dir, prices, n_trials, workers, cache)
+    else:
+        # Create callback with output_dir
+        callback = lambda study, trial: log_trial_callback(study, trial, output_dir)
+        
+        # Create and configure the study
+        study = optuna.create_study(direction="maximize", pruner=create_pruner(config))
+        
+        # Run optimization
+        run_trials(study, config, prices, n_trials, callback, cache)
     
     # Get best parameters
     best_trial = study.best_trial
@@ -186,6 +428,15 @@ def run_optimization(config, output_dir):
     print(f"Best Parameters: {best_params}")
     print(f"Final Capital: {best_trial.user_attrs.get('final_capital', 0):,.0f} VND")
     
+    run_optimized_backtest(config, output_dir, prices, best_params)
+    
+    return best_params
+
+
+def run_optimized_backtest(config, output_dir, prices, best_params):
+    """
+    Save the best parameters and backtest them on prices into output_dir/optimized_backtest
+    """
     # Save best parameters
     with open(os.path.join(output_dir, "best_parameters.yaml"), "w") as f:
         yaml.dump(best_params, f, default_flow_style=False)
@@ -204,21 +455,123 @@ def run_optimization(config, output_dir):
     optimized_dir = os.path.join(output_dir, "optimized_backtest")
     os.makedirs(optimized_dir, exist_ok=True)
     
-    backtest = DynamicGridBacktest(
-        capital=config['strategy']['capital'],
-        contract_value=config['strategy']['contract_value'],
-        margin_rate=config['strategy']['margin_rate'],
-        fee_per_trade=config['strategy']['fee_per_trade'],
-        grid_size_factor=best_params['grid_size_factor'],
-        minimum_grid_size=best_params['minimum_grid_size'],
-        move_pivot=best_params['move_pivot'],
-        # max_loss=config['strategy']['max_loss'],
-        take_profit_factor=best_params['take_profit_factor']
-    )
+    backtest = create_backtest(config, best_params)
     
     backtest.log_file = os.path.join(optimized_dir, "trade_log.txt")
-    backtest.backtest(prices)
-    backtest.print_results(optimized_dir)
+    metrics = backtest.backtest(prices)
+    backtest.print_results(optimized_dir, metrics)
+
+
+def evaluate_points(config, prices, points):
+    """
+    Backtest a list of parameter dicts in one batch and return their rows of the grid search results table
+    """
+    results = create_batch_backtest(config, points).backtest(prices)
+    rows = []
+    for point, metrics in zip(points, results):
+        row = dict(point)
+        for key in GRIDSEARCH_METRICS:
+            row[key] = np.nan if metrics is None else float(metrics[key])
+        row['objective'] = objective_value(metrics)
+        rows.append(row)
+    return rows
+
+
+def gridsearch_worker(config, price_spec, points):
+    """
+    evaluate_points in a worker process, on prices attached from shared memory
+    """
+    prices, blocks = attach_prices(price_spec)
+    try:
+        return evaluate_points(config, prices, points)
+    finally:
+        del prices
+        for block in blocks:
+            block.close()
+
+
+def load_checkpoint(path, columns):
+    """
+    Rows completed so far by a grid search, dropping a last line cut off by a crash
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    with open(path, 'rb+') as f:
+        content = f.read()
+        complete = content.rfind(b'\n') + 1
+        if complete < len(content):
+            f.truncate(complete)
+    if complete == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(path)
+
+
+def run_gridsearch(config, output_dir, workers=1, rebuild_cache=False):
+    """
+    Backtest every point of the parameter lattice on in-sample data, resuming
+    from the checkpoint in output_dir if there is one
+    """
+    prices = prepare_data(config, "in_sample", rebuild_cache)
+    
+    if prices is None:
+        print("Error: Failed to load in-sample data for grid search.")
+        return
+    
+    lattice = parameter_lattice(config)
+    names = list(lattice.columns)
+    columns = names + list(GRIDSEARCH_METRICS) + ['objective']
+    checkpoint_path = os.path.join(output_dir, "gridsearch_checkpoint.csv")
+    completed = load_checkpoint(checkpoint_path, columns)
+    done = set(completed[names].astype(float).round(10).itertuples(index=False, name=None))
+    points = [point for point in lattice.to_dict('records') if tuple(point.values()) not in done]
+    
+    print(f"Running grid search over {len(lattice)} parameter sets on in-sample data with {len(prices)} price points "
+          f"({len(lattice) - len(points)} already completed)...")
+    
+    chunk_size = config.get('optimization', {}).get('gridsearch_chunk_size', 32)
+    chunks = [points[i:i + chunk_size] for i in range(0, len(points), chunk_size)]
+    finished = len(lattice) - len(points)
+    
+    with open(checkpoint_path, 'a') as checkpoint:
+        def record(rows):
+            nonlocal finished
+            # Each chunk is appended and synced as a whole, so a crash loses at most the chunks in flight
+            pd.DataFrame(rows, columns=columns).to_csv(checkpoint, header=checkpoint.tell() == 0, index=False)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            finished += len(rows)
+            print(f"Grid search: {finished}/{len(lattice)} parameter sets completed")
+        
+        if workers > 1:
+            print(f"Running {len(chunks)} chunks across {workers} worker processes...")
+            blocks, price_spec = share_prices(prices)
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(gridsearch_worker, config, price_spec, chunk) for chunk in chunks]
+                    for future in as_completed(futures):
+                        record(future.result())
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+        else:
+            for chunk in chunks:
+                record(evaluate_points(config, prices, chunk))
+    
+    # Full table in lattice order, for surface plots over any pair of parameters
+    results = load_checkpoint(checkpoint_path, columns).sort_values(names).reset_index(drop=True)
+    results.to_csv(os.path.join(output_dir, "gridsearch_results.csv"), index=False)
+    
+    best = results.loc[results['objective'].idxmax()]
+    best_params = {name: int(best[name]) if step is None else float(best[name])
+                   for name, _, _, step in search_ranges(config)}
+    
+    print("\nGrid Search Results:")
+    print(f"Best Sharpe Ratio: {best['objective']:.2f}")
+    print(f"Best Parameters: {best_params}")
+    print(f"Final Capital: {best['final_capital']:,.0f} VND")
+    
+    run_optimized_backtest(config, output_dir, prices, best_params)
     
     return best_params
 
@@ -228,12 +581,19 @@ def main():
     Main function to run the driver
     """
     parser = argparse.ArgumentParser(description='Grid Trading Backtest and Optimization')
-    parser.add_argument('--mode', type=str, choices=['backtest', 'optimize'], required=True,
-                       help='Run mode: backtest or optimize')
+    parser.add_argument('--mode', type=str, choices=['backtest', 'optimize', 'gridsearch'], required=True,
+                       help='Run mode: backtest, optimize or gridsearch')
     parser.add_argument('--data', type=str, choices=['in_sample', 'out_sample'], default='in_sample',
                        help='Data to use for backtest (fetched data will be used in place if fetch_data is true)')
     parser.add_argument('--config', type=str, default='config/config.yaml',
                        help='Path to config file')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of processes to run optimization trials or grid search chunks in '
+                            '(only applicable for optimize and gridsearch modes)')
+    parser.add_argument('--resume', type=str, default=None,
+                       help='Results folder of an interrupted grid search to continue (only applicable for gridsearch mode)')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                       help='Re-parse the price file and rewrite its binary cache')
     
     args = parser.parse_args()
     
@@ -246,19 +606,30 @@ def main():
         return
     
     # Setup results directory
-    output_dir = setup_results_dir(config, args.mode)
+    if args.resume:
+        if args.mode != 'gridsearch' or not os.path.isdir(args.resume):
+            print(f"Error: --resume needs gridsearch mode and an existing results folder: {args.resume}")
+            return
+        output_dir = args.resume
+    else:
+        output_dir = setup_results_dir(config, args.mode)
     print(f"Results will be saved to: {output_dir}")
     
     if args.mode == 'backtest':
-        run_backtest(config, args.data, output_dir)
+        run_backtest(config, args.data, output_dir, args.rebuild_cache)
     elif args.mode == 'optimize':
         if args.data == 'out_sample':
             print("Warning: Optimization should only be run on in-sample data. Switching to in-sample.")
-        run_optimization(config, output_dir)
+        run_optimization(config, output_dir, args.workers, args.rebuild_cache)
         if os.path.exists("trade_log.txt"):
             os.remove("trade_log.txt")
             print("Removed redundant trade_log.txt from root directory")
+    elif args.mode == 'gridsearch':
+        if args.data == 'out_sample':
+            print("Warning: Grid search should only be run on in-sample data. Switching to in-sample.")
+        run_gridsearch(config, output_dir, args.workers, args.rebuild_cache)
     
+    wait_for_plots()
     print(f"\nAll results saved to: {output_dir}")
 
 
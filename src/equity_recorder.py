@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from session_calendar import NS_PER_DAY
+
+# Fixed-width bucket resolutions, in nanoseconds
+BUCKET_NS = {
+    '1s': 1000000000,
+    '1min': 60 * 1000000000,
+    'daily': NS_PER_DAY,
+}
+EQUITY_RESOLUTIONS = ('tick', 'event') + tuple(BUCKET_NS)
+
+
+class EquityRecorder:
+    """
+    Reduces a tick-level equity curve to the configured resolution for
+    export and plotting.
+
+    "tick" keeps every marked tick. "1s", "1min" and "daily" bucket ticks by
+    wall-clock time (labelled with the bucket start), "event" starts a new
+    bucket at every tick with a trade event (labelled with that tick). Each
+    bucket keeps the open, high, low and close equity of its ticks, so the
+    peaks and troughs that drawdowns are measured from are never lost.
+    """
+    def __init__(self, resolution='tick'):
+        if resolution not in EQUITY_RESOLUTIONS:
+            raise ValueError(f"Unknown equity resolution: {resolution}")
+        self.resolution = resolution
+
+    def record(self, equity_series, event_ns=None):
+        """
+        Equity at this resolution: the Series itself (without unmarked ticks)
+        for "tick", otherwise a DataFrame of open/high/low/close per bucket.
+        event_ns are the epoch-ns timestamps of trade events, for "event".
+        """
+        equity = equity_series.dropna()
+        if self.resolution == 'tick' or equity.empty:
+            return equity
+        values = equity.to_numpy(dtype=np.float64)
+        epoch_ns = equity.index.values.astype("datetime64[ns]").view(np.int64)
+
+        if self.resolution == 'event':
+            events = np.unique(event_ns if event_ns is not None else np.empty(0, dtype=np.int64))
+            buckets = np.searchsorted(events, epoch_ns, side='right')
+        else:
+            buckets = epoch_ns // BUCKET_NS[self.resolution]
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.append(starts[1:], len(values)) - 1
+
+        if self.resolution == 'event':
+            labels = epoch_ns[starts]
+        else:
+            labels = buckets[starts] * BUCKET_NS[self.resolution]
+        return pd.DataFrame({
+            'open': values[starts],
+            'high': np.maximum.reduceat(values, starts),
+            'low': np.minimum.reduceat(values, starts),
+            'close': values[ends],
+        }, index=pd.DatetimeIndex(labels.view("datetime64[ns]"), name=equity.index.name))
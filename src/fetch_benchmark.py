@@ -0,0 +1,94 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import psycopg
+
+from data_fetcher import db_connection_kwargs, fetch_price_arrays, FETCH_BATCH_SIZE
+
+
+def create_benchmark_table(conn, table, rows):
+    """
+    (Re)create a synthetic tick table with the given number of rows,
+    generated on the server
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"CREATE TABLE {table} (datetime timestamp, price numeric(6, 1))")
+        cur.execute(f"INSERT INTO {table} "
+                    "SELECT timestamp '2024-01-02 09:00' + g * interval '250 milliseconds', "
+                    "round((1200 + 20 * sin(g / 5000.0))::numeric, 1) "
+                    "FROM generate_series(1, %s) AS g", (rows,))
+    conn.commit()
+
+
+def fetchall_arrays(conn, query):
+    """
+    The original fetch path: fetchall, then per-row Python conversion
+    """
+    with conn.cursor() as cur:
+        cur.execute(query)
+        result = cur.fetchall()
+    timestamps = [row[0] for row in result]
+    prices = [float(row[1]) for row in result]
+    df = pd.Series(prices, index=pd.to_datetime(timestamps))
+    return df.index.values.astype("datetime64[ns]").view(np.int64), df.to_numpy()
+
+
+def main():
+    """
+    Compare fetchall, named-cursor streaming and binary COPY on a synthetic
+    table in the database configured in .env
+    """
+    parser = argparse.ArgumentParser(description='Tick Fetch Benchmark')
+    parser.add_argument('--rows', type=int, default=1000000,
+                       help='Number of rows in the benchmark table')
+    parser.add_argument('--table', type=str, default='vn30_fetch_benchmark',
+                       help='Name of the benchmark table')
+    parser.add_argument('--skip-setup', action='store_true',
+                       help='Reuse an existing benchmark table instead of recreating it')
+    parser.add_argument('--keep-table', action='store_true',
+                       help='Do not drop the benchmark table afterwards')
+    parser.add_argument('--batch-size', type=int, default=FETCH_BATCH_SIZE,
+                       help='Rows per round trip for the named cursor')
+
+    args = parser.parse_args()
+
+    query = f"SELECT datetime, price FROM {args.table} ORDER BY datetime"
+    methods = {
+        'fetchall': lambda conn: fetchall_arrays(conn, query),
+        'cursor': lambda conn: fetch_price_arrays(conn, query, None, args.batch_size, "cursor"),
+        'copy': lambda conn: fetch_price_arrays(conn, query, None, args.batch_size, "copy"),
+    }
+
+    with psycopg.connect(**db_connection_kwargs()) as conn:
+        if not args.skip_setup:
+            print(f"Creating {args.table} with {args.rows:,} rows...")
+            create_benchmark_table(conn, args.table, args.rows)
+
+        results = {}
+        reference = None
+        for method, fetch in methods.items():
+            start = time.perf_counter()
+            timestamps, prices = fetch(conn)
+            elapsed = time.perf_counter() - start
+            conn.commit()
+            if reference is None:
+                reference = (timestamps, prices)
+            elif not (np.array_equal(timestamps, reference[0]) and np.array_equal(prices, reference[1])):
+                print(f"Warning: {method} returned different data than fetchall.")
+            results[method] = (len(prices), elapsed)
+
+        if not args.keep_table:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {args.table}")
+            conn.commit()
+
+    baseline = results['fetchall'][1]
+    print(f"\n{'Method':<10}{'Rows':>12}{'Seconds':>12}{'Rows/s':>14}{'Speedup':>10}")
+    for method, (rows, elapsed) in results.items():
+        print(f"{method:<10}{rows:>12,}{elapsed:>12.2f}{rows / elapsed:>14,.0f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
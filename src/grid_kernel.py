@@ -0,0 +1,523 @@
+import numpy as np
+
+from trade_store import (EVENT_NAMES, BUY, SELL, TAKE_PROFIT_BUY, TAKE_PROFIT_SELL, CLOSE_PAIR, CLOSE_BUY, CLOSE_SELL,
+                         TOTAL_FEE, OVERNIGHT_FEE)
+from metrics import EQUITY_BLOCK
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+# Besides the TradeStore event codes the kernel emits markers for max-loss closes
+MAX_LOSS_BUY = len(EVENT_NAMES)
+MAX_LOSS_SELL = MAX_LOSS_BUY + 1
+
+SIDE_BUY = 1
+SIDE_SELL = -1
+
+EVENT_DTYPE = np.dtype([
+    ('index', np.int64),
+    ('event', np.int8),
+    ('price', np.float64),
+    ('size', np.float64),
+    ('profit', np.float64),
+    ('fee', np.float64),
+])
+
+
+@njit(cache=True)
+def _emit(events, count, index, event, price, size, profit, fee):
+    # Keep counting past capacity so the caller can retry with an exact buffer
+    if count < events.shape[0]:
+        events[count]['index'] = index
+        events[count]['event'] = event
+        events[count]['price'] = price
+        events[count]['size'] = size
+        events[count]['profit'] = profit
+        events[count]['fee'] = fee
+    return count + 1
+
+
+@njit(cache=True)
+def _remove_position(sides, entries, sizes, count, slot, net_quantity, entry_notional, contract_value):
+    # Mirrors PositionBook.close, including the reset of the aggregates on an empty book
+    signed_size = sizes[slot] * sides[slot]
+    if count == 1:
+        net_quantity = 0.0
+        entry_notional = 0.0
+    else:
+        net_quantity -= signed_size
+        entry_notional -= signed_size * entries[slot] * contract_value
+    for j in range(slot, count - 1):
+        sides[j] = sides[j + 1]
+        entries[j] = entries[j + 1]
+        sizes[j] = sizes[j + 1]
+    return count - 1, net_quantity, entry_notional
+
+
+@njit(cache=True)
+def _find_position(sides, entries, sizes, count, side, entry, size):
+    for j in range(count):
+        if sides[j] == side and entries[j] == entry and sizes[j] == size:
+            return j
+    return -1
+
+
+@njit(cache=True)
+def _close_all(sides, entries, sizes, count, price, index, contract_value, fee_per_trade, capital, events, n_events):
+    total_fee = 0.0
+    for j in range(count):
+        if sides[j] == SIDE_BUY:
+            profit_before_fee = (price - entries[j]) * sizes[j] * contract_value
+            event = CLOSE_BUY
+        else:
+            profit_before_fee = (entries[j] - price) * sizes[j] * contract_value
+            event = CLOSE_SELL
+        fee = fee_per_trade * contract_value
+        profit = profit_before_fee - fee
+        capital += profit
+        n_events = _emit(events, n_events, index, event, price, sizes[j], profit, fee)
+        total_fee += fee
+    if total_fee > 0:
+        n_events = _emit(events, n_events, index, TOTAL_FEE, price, 0.0, 0.0, total_fee)
+    return capital, n_events
+
+
+@njit(cache=True)
+def _rolling_atr_value(count, total, window, last_valid_atr):
+    if count == 0 or count < window // 2:
+        return last_valid_atr
+    return total / count
+
+
+@njit(cache=True)
+def _calculate_grid(current_atr, last_valid_atr, atr_count, atr_total, atr_window, index, sizes, count,
+                    grid_size_factor, minimum_grid_size, max_contracts):
+    if current_atr != current_atr:
+        current_atr = last_valid_atr
+    else:
+        last_valid_atr = current_atr
+    grid_size = max(grid_size_factor * current_atr, minimum_grid_size)
+    grid_size = min(grid_size, 10.0)
+    size_per_level = 1.0
+    total_open_contracts = 0.0
+    for j in range(count):
+        total_open_contracts += sizes[j]
+    if total_open_contracts + size_per_level > max_contracts:
+        size_per_level = 0.0
+    if index >= atr_window:
+        short_atr = _rolling_atr_value(atr_count, atr_total, atr_window, last_valid_atr)
+        grid_size = max(grid_size, short_atr * grid_size_factor)
+        grid_size = min(grid_size, 10.0)
+    return grid_size, size_per_level, last_valid_atr
+
+
+@njit(cache=True)
+def _update_atr(atr_buffer, atr_position, atr_count, atr_total, change):
+    # Mirrors RollingATR.update, including the once-per-lap resync of the running sum
+    atr_window = atr_buffer.shape[0]
+    if atr_count == atr_window:
+        atr_total -= atr_buffer[atr_position]
+    else:
+        atr_count += 1
+    atr_buffer[atr_position] = change
+    atr_total += change
+    atr_position += 1
+    if atr_position == atr_window:
+        atr_position = 0
+        atr_total = 0.0
+        for j in range(atr_count):
+            atr_total += atr_buffer[j]
+    return atr_position, atr_count, atr_total
+
+
+@njit(cache=True)
+def run_batch_kernel(values, days, trading_flags, end_of_day_flags, new_day_flags, final_close_flags, opening_days,
+                     opening_atr, start, stop, equity, events, n_events, alive, opened_volume, sides, entries, sizes,
+                     position_count, net_quantity, entry_notional, capital, current_pivot, has_grid, grid_size, size,
+                     last_valid_atr, daily_atr, atr_buffer, atr_counts, atr_sums, contract_value, fee_per_trade,
+                     grid_size_factor, minimum_grid_size, move_pivot, max_loss, take_profit_factor, max_positions,
+                     max_contracts, daily_fee, daily_fee_limit):
+    """
+    The grid loop of DynamicGridBacktest._run_ticks for K grid states in
+    lockstep over ticks start..stop-1.
+
+    Row k of the (K, capacity) position arrays and of the (K,) state and
+    parameter arrays is one grid; all of them are updated in place so a
+    later call continues where this one stopped. The rolling ATR, shared by
+    every grid, is carried in atr_buffer, atr_counts (position, count) and
+    atr_sums (total, last price). Equity of tick i goes to equity[k, i - start],
+    NaN where unmarked or once the grid has run out of capital (alive[k]
+    False). Events of all grids go to the events array from n_events on;
+    returns the new event count.
+    """
+    n = values.shape[0]
+    atr_window = atr_buffer.shape[0]
+    snapshot_sides = np.empty(sides.shape[1], dtype=sides.dtype)
+    snapshot_entries = np.empty(sides.shape[1])
+    snapshot_sizes = np.empty(sides.shape[1])
+    atr_position = atr_counts[0]
+    atr_count = atr_counts[1]
+    atr_total = atr_sums[0]
+    last_price = atr_sums[1]
+    for i in range(start, stop):
+        current_price = values[i]
+        atr_position, atr_count, atr_total = _update_atr(atr_buffer, atr_position, atr_count, atr_total,
+                                                         abs(current_price - last_price))
+        last_price = current_price
+        current_day = days[i]
+        trading = trading_flags[i]
+        end_of_day = end_of_day_flags[i]
+        new_day = new_day_flags[i]
+        final_close = final_close_flags[i]
+        last_tick = i == n - 1
+        any_alive = False
+
+        for k in range(capital.shape[0]):
+            if not alive[k]:
+                equity[k, i - start] = np.nan
+                continue
+            any_alive = True
+            row_sides = sides[k]
+            row_entries = entries[k]
+            row_sizes = sizes[k]
+            count = position_count[k]
+            row_net_quantity = net_quantity[k]
+            row_entry_notional = entry_notional[k]
+            row_capital = capital[k]
+            row_pivot = current_pivot[k]
+            row_grid_size = grid_size[k]
+            row_size = size[k]
+            row_last_valid_atr = last_valid_atr[k]
+            row_daily_atr = daily_atr[k]
+
+            marked = np.nan
+            if new_day and count > 0:
+                total_overnight_fee = count * 2550.0
+                row_capital -= total_overnight_fee
+                n_events = _emit(events, n_events, i, OVERNIGHT_FEE, 0.0, count, 0.0, total_overnight_fee)
+
+            if row_daily_atr != row_daily_atr and trading:
+                row_daily_atr = row_last_valid_atr
+                slot = np.searchsorted(opening_days, current_day)
+                if slot < opening_days.shape[0] and opening_days[slot] == current_day:
+                    row_daily_atr = opening_atr[slot]
+
+            if row_daily_atr == row_daily_atr and trading:
+                current_atr = row_daily_atr
+            else:
+                current_atr = row_last_valid_atr
+
+            if final_close and count > 0:
+                row_capital, n_events = _close_all(row_sides, row_entries, row_sizes, count, current_price, i,
+                                                   contract_value, fee_per_trade, row_capital, events, n_events)
+                count = 0
+                row_net_quantity = 0.0
+                row_entry_notional = 0.0
+                marked = row_capital
+
+            elif not trading or end_of_day:
+                # Outside the session equity is only marked on a flat book
+                if end_of_day or count == 0:
+                    marked = row_capital
+
+            else:
+                if not has_grid[k]:
+                    row_grid_size, row_size, row_last_valid_atr = _calculate_grid(
+                        current_atr, row_last_valid_atr, atr_count, atr_total, atr_window, i, row_sizes, count,
+                        grid_size_factor[k], minimum_grid_size[k], max_contracts)
+                    has_grid[k] = True
+                buypivot = row_pivot - move_pivot[k] * row_grid_size
+                sellpivot = row_pivot + move_pivot[k] * row_grid_size
+
+                if current_price < buypivot or current_price > sellpivot:
+                    row_capital, n_events = _close_all(row_sides, row_entries, row_sizes, count, current_price, i,
+                                                       contract_value, fee_per_trade, row_capital, events, n_events)
+                    count = 0
+                    row_net_quantity = 0.0
+                    row_entry_notional = 0.0
+                    row_pivot = current_price
+                    current_atr = _rolling_atr_value(atr_count, atr_total, atr_window, row_last_valid_atr)
+                    row_grid_size, row_size, row_last_valid_atr = _calculate_grid(
+                        current_atr, row_last_valid_atr, atr_count, atr_total, atr_window, i, row_sizes, count,
+                        grid_size_factor[k], minimum_grid_size[k], max_contracts)
+
+                max_loss_per_trade = 500000 * max_loss
+                forced_close_triggered = False
+
+                take_profit = take_profit_factor[k] * row_grid_size * contract_value
+                snapshot_count = count
+                for j in range(count):
+                    snapshot_sides[j] = row_sides[j]
+                    snapshot_entries[j] = row_entries[j]
+                    snapshot_sizes[j] = row_sizes[j]
+                for j in range(snapshot_count):
+                    side = snapshot_sides[j]
+                    entry_price = snapshot_entries[j]
+                    size_pos = snapshot_sizes[j]
+                    if side == SIDE_BUY:
+                        profit = (current_price - entry_price) * size_pos * contract_value
+                        event = TAKE_PROFIT_BUY
+                    else:
+                        profit = (entry_price - current_price) * size_pos * contract_value
+                        event = TAKE_PROFIT_SELL
+                    if profit >= take_profit:
+                        fee = fee_per_trade * contract_value
+                        profit = profit - fee
+                        row_capital += profit
+                        slot = _find_position(row_sides, row_entries, row_sizes, count, side, entry_price, size_pos)
+                        count, row_net_quantity, row_entry_notional = _remove_position(
+                            row_sides, row_entries, row_sizes, count, slot, row_net_quantity, row_entry_notional,
+                            contract_value)
+                        n_events = _emit(events, n_events, i, event, current_price, size_pos, profit, fee)
+                        continue
+
+                    if side == SIDE_BUY:
+                        loss = ((entry_price - current_price) * size_pos * contract_value
+                                if current_price < entry_price else 0.0)
+                        event = MAX_LOSS_BUY
+                    else:
+                        loss = ((current_price - entry_price) * size_pos * contract_value
+                                if current_price > entry_price else 0.0)
+                        event = MAX_LOSS_SELL
+                    if loss >= max_loss_per_trade:
+                        row_capital, n_events = _close_all(row_sides, row_entries, row_sizes, count, current_price, i,
+                                                           contract_value, fee_per_trade, row_capital, events,
+                                                           n_events)
+                        count = 0
+                        row_net_quantity = 0.0
+                        row_entry_notional = 0.0
+                        row_pivot = current_price
+                        current_atr = _rolling_atr_value(atr_count, atr_total, atr_window, row_last_valid_atr)
+                        row_grid_size, row_size, row_last_valid_atr = _calculate_grid(
+                            current_atr, row_last_valid_atr, atr_count, atr_total, atr_window, i, row_sizes, count,
+                            grid_size_factor[k], minimum_grid_size[k], max_contracts)
+                        n_events = _emit(events, n_events, i, event, current_price, 0.0, 0.0, 0.0)
+                        forced_close_triggered = True
+                        break
+
+                if (count < max_positions and row_size > 0 and not daily_fee > daily_fee_limit
+                        and not forced_close_triggered):
+                    num_buys = 0
+                    num_sells = 0
+                    for j in range(count):
+                        if row_sides[j] == SIDE_BUY:
+                            num_buys += 1
+                        else:
+                            num_sells += 1
+                    max_buys = 6
+                    max_sells = 6
+
+                    for level in range(1, 7):
+                        buy_level = np.rint((row_pivot - (level - 0.5) * row_grid_size) * 10) / 10
+                        sell_level = np.rint((row_pivot + (level - 0.5) * row_grid_size) * 10) / 10
+
+                        if num_buys < max_buys and current_price <= buy_level:
+                            nearby = False
+                            for j in range(count):
+                                if (row_sides[j] == SIDE_BUY
+                                        and abs(row_entries[j] - current_price) < row_grid_size * 0.5):
+                                    nearby = True
+                                    break
+                            if not nearby:
+                                row_sides[count] = SIDE_BUY
+                                row_entries[count] = current_price
+                                row_sizes[count] = row_size
+                                count += 1
+                                row_net_quantity += row_size
+                                row_entry_notional += row_size * current_price * contract_value
+                                n_events = _emit(events, n_events, i, BUY, current_price, row_size, 0.0, 0.0)
+                                opened_volume[k] += row_size
+                                num_buys += 1
+
+                                slot = -1
+                                for j in range(count):
+                                    if row_sides[j] == SIDE_SELL:
+                                        slot = j
+                                        break
+                                if slot >= 0:
+                                    profit_before_fee = ((row_entries[slot] - current_price) * row_size
+                                                         * contract_value)
+                                    fee = fee_per_trade * contract_value
+                                    profit = profit_before_fee - fee
+                                    row_capital += profit
+                                    count, row_net_quantity, row_entry_notional = _remove_position(
+                                        row_sides, row_entries, row_sizes, count, slot, row_net_quantity,
+                                        row_entry_notional, contract_value)
+                                    slot = _find_position(row_sides, row_entries, row_sizes, count, SIDE_BUY,
+                                                          current_price, row_size)
+                                    count, row_net_quantity, row_entry_notional = _remove_position(
+                                        row_sides, row_entries, row_sizes, count, slot, row_net_quantity,
+                                        row_entry_notional, contract_value)
+                                    n_events = _emit(events, n_events, i, CLOSE_PAIR, current_price, row_size,
+                                                     profit, fee)
+                                    num_buys -= 1
+                                    num_sells -= 1
+                                    continue
+
+                        if num_sells < max_sells and current_price >= sell_level:
+                            nearby = False
+                            for j in range(count):
+                                if (row_sides[j] == SIDE_SELL
+                                        and abs(row_entries[j] - current_price) < row_grid_size * 0.5):
+                                    nearby = True
+                                    break
+                            if not nearby:
+                                row_sides[count] = SIDE_SELL
+                                row_entries[count] = current_price
+                                row_sizes[count] = row_size
+                                count += 1
+                                row_net_quantity -= row_size
+                                row_entry_notional += -row_size * current_price * contract_value
+                                n_events = _emit(events, n_events, i, SELL, current_price, row_size, 0.0, 0.0)
+                                opened_volume[k] += row_size
+                                num_sells += 1
+
+                                slot = -1
+                                for j in range(count):
+                                    if row_sides[j] == SIDE_BUY:
+                                        slot = j
+                                        break
+                                if slot >= 0:
+                                    profit_before_fee = ((current_price - row_entries[slot]) * row_size
+                                                         * contract_value)
+                                    fee = fee_per_trade * contract_value
+                                    profit = profit_before_fee - fee
+                                    row_capital += profit
+                                    count, row_net_quantity, row_entry_notional = _remove_position(
+                                        row_sides, row_entries, row_sizes, count, slot, row_net_quantity,
+                                        row_entry_notional, contract_value)
+                                    slot = _find_position(row_sides, row_entries, row_sizes, count, SIDE_SELL,
+                                                          current_price, row_size)
+                                    count, row_net_quantity, row_entry_notional = _remove_position(
+                                        row_sides, row_entries, row_sizes, count, slot, row_net_quantity,
+                                        row_entry_notional, contract_value)
+                                    n_events = _emit(events, n_events, i, CLOSE_PAIR, current_price, row_size,
+                                                     profit, fee)
+                                    num_buys -= 1
+                                    num_sells -= 1
+                                    continue
+
+                marked = row_capital + (row_net_quantity * current_price * contract_value - row_entry_notional)
+
+                if row_capital < 0:
+                    alive[k] = False
+                elif last_tick and count > 0:
+                    row_capital, n_events = _close_all(row_sides, row_entries, row_sizes, count, current_price, i,
+                                                       contract_value, fee_per_trade, row_capital, events, n_events)
+                    count = 0
+                    row_net_quantity = 0.0
+                    row_entry_notional = 0.0
+                    marked = row_capital
+
+            equity[k, i - start] = marked
+            position_count[k] = count
+            net_quantity[k] = row_net_quantity
+            entry_notional[k] = row_entry_notional
+            capital[k] = row_capital
+            current_pivot[k] = row_pivot
+            grid_size[k] = row_grid_size
+            size[k] = row_size
+            last_valid_atr[k] = row_last_valid_atr
+            daily_atr[k] = row_daily_atr
+        if not any_alive:
+            break
+
+    atr_counts[0] = atr_position
+    atr_counts[1] = atr_count
+    atr_sums[0] = atr_total
+    atr_sums[1] = last_price
+    return n_events
+
+
+def run_grid_kernel(values, days, trading_flags, end_of_day_flags, new_day_flags, final_close_flags, opening_days,
+                    opening_atr, equity, events, sides, entries, sizes, position_count, net_quantity, entry_notional,
+                    capital, last_valid_atr, daily_atr, contract_value, fee_per_trade, grid_size_factor,
+                    minimum_grid_size, move_pivot, max_loss, take_profit_factor, max_positions, max_contracts,
+                    daily_fee, daily_fee_limit, atr_window, progress=None):
+    """
+    Compiled version of DynamicGridBacktest._run_ticks: run_batch_kernel
+    over all ticks with a single grid.
+
+    Positions live in the fixed-capacity sides/entries/sizes arrays (kept in
+    insertion order, like the reference list), with the same net quantity and
+    entry notional aggregates as PositionBook. The ticks run in segments of
+    at most EQUITY_BLOCK, each one's equity assigned to equity[start:stop]
+    (a float64 array or an EquityBlocks), and events are written into the
+    EVENT_DTYPE array, which is replaced by a larger one if it fills up.
+    daily_atr is NaN until the first trading tick sets it.
+
+    With progress, the ticks run one date at a time and progress(i) is
+    called after each date with the index of the first tick of the next
+    one (n after the last); an exception from it stops the run. Returns
+    completed, events, n_events, count, capital, current_pivot,
+    last_valid_atr and daily_atr.
+    """
+    n = values.shape[0]
+    state = {
+        'alive': np.ones(1, dtype=np.bool_),
+        'opened_volume': np.zeros(1),
+        'sides': sides.reshape(1, -1),
+        'entries': entries.reshape(1, -1),
+        'sizes': sizes.reshape(1, -1),
+        'count': np.full(1, position_count, dtype=np.int64),
+        'net_quantity': np.full(1, net_quantity),
+        'entry_notional': np.full(1, entry_notional),
+        'capital': np.full(1, capital),
+        'current_pivot': np.full(1, values[0]),
+        'has_grid': np.zeros(1, dtype=np.bool_),
+        'grid_size': np.zeros(1),
+        'size': np.zeros(1),
+        'last_valid_atr': np.full(1, last_valid_atr),
+        'daily_atr': np.full(1, daily_atr),
+        'atr_buffer': np.zeros(atr_window),
+        'atr_counts': np.zeros(2, dtype=np.int64),
+        'atr_sums': np.array([0.0, values[0]]),
+    }
+    parameters = (np.full(1, grid_size_factor), np.full(1, minimum_grid_size), np.full(1, move_pivot))
+    take_profit_factors = np.full(1, take_profit_factor)
+    bounds = np.concatenate((np.arange(1, n, EQUITY_BLOCK), [n]))
+    if progress is not None:
+        dates = np.flatnonzero(new_day_flags[1:]) + 1
+        bounds = np.unique(np.concatenate((bounds, dates)))
+        reported = np.isin(bounds, np.append(dates, n))
+    segment_equity = np.empty((1, min(EQUITY_BLOCK, n)))
+
+    n_events = 0
+    for segment, (start, stop) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+        snapshot = {name: array.copy() for name, array in state.items()}
+        # Ticks after the grid dies are left unmarked
+        segment_equity.fill(np.nan)
+        while True:
+            written = run_batch_kernel(
+                values, days, trading_flags, end_of_day_flags, new_day_flags, final_close_flags, opening_days,
+                opening_atr, start, stop, segment_equity, events, n_events, state['alive'],
+                state['opened_volume'], state['sides'], state['entries'], state['sizes'], state['count'],
+                state['net_quantity'], state['entry_notional'], state['capital'], state['current_pivot'],
+                state['has_grid'], state['grid_size'], state['size'], state['last_valid_atr'], state['daily_atr'],
+                state['atr_buffer'], state['atr_counts'], state['atr_sums'], contract_value, fee_per_trade,
+                *parameters, max_loss, take_profit_factors, max_positions, max_contracts, daily_fee,
+                daily_fee_limit)
+            if written <= events.shape[0]:
+                break
+            # The events array filled up: grow it and run the segment again from its saved state
+            grown = np.empty(max(written, 2 * events.shape[0]), dtype=events.dtype)
+            grown[:n_events] = events[:n_events]
+            events = grown
+            for name, array in state.items():
+                array[...] = snapshot[name]
+        n_events = written
+        equity[start:stop] = segment_equity[0, :stop - start]
+        if not state['alive'][0]:
+            break
+        if progress is not None and reported[segment + 1]:
+            progress(stop)
+    return (state['alive'][0], events, n_events, state['count'][0], state['capital'][0], state['current_pivot'][0],
+            state['last_valid_atr'][0], state['daily_atr'][0])
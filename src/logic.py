@@ -1,9 +1,35 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import time, datetime
+from datetime import time
 import os
 
+from positions import PositionBook
+from trade_log import NullTradeLogSink, create_trade_log_sink
+from trade_store import TradeStore, TradeTally, EVENT_NAMES, BUY, SELL
+from grid_kernel import NUMBA_AVAILABLE, EVENT_DTYPE, MAX_LOSS_BUY, SIDE_BUY, SIDE_SELL, run_grid_kernel
+from session_calendar import SessionCalendar, split_day_time
+from metrics import performance_metrics, EquityBlocks
+from equity_recorder import EquityRecorder
+from plotting import PLOT_MODES, submit_plot
+
+def price_arrays(prices):
+    """
+    Decode a price Series into contiguous arrays: float64 prices, int64 epoch
+    nanoseconds, int32 session dates (days since epoch) and int64
+    microseconds since midnight.
+    """
+    values = np.ascontiguousarray(prices.to_numpy(dtype=np.float64))
+    epoch_ns = np.ascontiguousarray(prices.index.values.astype("datetime64[ns]").view(np.int64))
+    days, times = split_day_time(epoch_ns)
+    return values, epoch_ns, days, times
+
+def round_level(price):
+    """
+    Round a grid level to one decimal the way np.round does (scale by 10,
+    round half to even, scale back), whether price is a float or np.float64
+    """
+    return round(price * 10) / 10
+
 def calculate_atr(prices, period=50, window=None, last_valid_atr=1.0):
     """
     Calculate Average True Range
@@ -17,9 +43,92 @@ def calculate_atr(prices, period=50, window=None, last_valid_atr=1.0):
         return pd.Series(last_valid_atr, index=prices.index)
     return atr_series.fillna(method='bfill')
 
+def calculate_opening_atr(prices, start=time(8, 45), end=time(9, 0)):
+    """
+    Calculate the pre-open ATR for every trading date in one pass.
+    Returns a Series indexed by date; dates with fewer than 2 ticks in
+    [start, end) are left out.
+    """
+    values = prices.to_numpy(dtype=np.float64)
+    index = prices.index
+    days = index.normalize().unique()
+    starts = index.searchsorted(days + pd.Timedelta(hours=start.hour, minutes=start.minute))
+    ends = index.searchsorted(days + pd.Timedelta(hours=end.hour, minutes=end.minute))
+    atr = {}
+    for day, lo, hi in zip(days, starts, ends):
+        if hi - lo >= 2:
+            atr[day.date()] = np.abs(np.diff(values[lo:hi])).sum() / (hi - lo - 1)
+    return pd.Series(atr, dtype=np.float64)
+
+class RollingATR:
+    """
+    Incremental ATR over the last `window` absolute price changes.
+    Fed one tick at a time, matches calculate_atr(prices[:i + 1], window=window).
+    """
+    def __init__(self, window=60):
+        self.window = window
+        self.buffer = [0.0] * window
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+        self.last_price = None
+
+    def update(self, price):
+        if self.last_price is not None:
+            change = abs(price - self.last_price)
+            if self.count == self.window:
+                self.total -= self.buffer[self.position]
+            else:
+                self.count += 1
+            self.buffer[self.position] = change
+            self.total += change
+            self.position += 1
+            if self.position == self.window:
+                self.position = 0
+                # Resync the running sum once per lap so rounding drift cannot accumulate
+                self.total = sum(self.buffer[:self.count])
+        self.last_price = price
+
+    def update_many(self, prices):
+        """
+        Same result as update() on each price of the float64 array in turn, in
+        O(window) Python steps: only the changes since the last completed lap
+        affect the state
+        """
+        if len(prices) and self.last_price is None:
+            self.update(float(prices[0]))
+            prices = prices[1:]
+        if len(prices) < 2 * self.window:
+            for price in prices.tolist():
+                self.update(price)
+            return
+        changes = np.abs(np.diff(prices, prepend=self.last_price))
+        # Update m (1-based) completes a lap when (position + m) % window == 0; take the last one
+        lap_end = len(prices) - (self.position + len(prices)) % self.window
+        self.buffer = changes[lap_end - self.window:lap_end].tolist()
+        self.count = self.window
+        self.position = 0
+        self.total = sum(self.buffer)
+        self.last_price = float(prices[lap_end - 1])
+        for price in prices[lap_end:].tolist():
+            self.update(price)
+
+    def value(self, last_valid_atr=1.0):
+        if self.count == 0 or self.count < self.window // 2:
+            return last_valid_atr
+        return self.total / self.count
+
 class DynamicGridBacktest:
     def __init__(self, capital=500e6, contract_value=100e3, margin_rate=0.2, fee_per_trade=0.47, 
-                 grid_size_factor=1.47, minimum_grid_size=0.4, move_pivot=6, max_loss=20, take_profit_factor=1.0):
+                 grid_size_factor=1.47, minimum_grid_size=0.4, move_pivot=6, max_loss=20, take_profit_factor=1.0,
+                 engine="pandas", trade_log="text", trade_log_buffer=1000, session_calendar=None,
+                 equity_resolution="tick", plot="sync", plot_points=3000, fast=False):
+        if engine not in ("pandas", "numpy", "numba", "events"):
+            raise ValueError(f"Unknown backtest engine: {engine}")
+        if plot not in PLOT_MODES:
+            raise ValueError(f"Unknown plot mode: {plot}")
+        if engine == "numba" and not NUMBA_AVAILABLE:
+            engine = "numpy"
         self.capital = capital  
         self.contract_value = contract_value  
         self.margin_rate = margin_rate  
@@ -28,14 +137,26 @@ class DynamicGridBacktest:
         self.grid_size_factor = grid_size_factor  
         self.max_positions = 12  
         self.daily_fee_limit = 50000000  
-        self.positions = []  
+        self.positions = PositionBook(self.max_positions, contract_value)
         self.equity = [capital]  
-        self.trades = []  
         self.last_date = None  
         self.daily_fee = 0  
         self.log_file = "trade_log.txt" 
+        self.trade_log_format = trade_log
+        self.trade_log_buffer = trade_log_buffer
+        self.trade_log_sink = NullTradeLogSink()
         self.equity_series = None 
-        self.trade_history = []  
+        # Fast runs fold their equity into this during the run instead of keeping equity_series
+        self.equity_blocks = None
+        self.equity_recorder = EquityRecorder(equity_resolution)
+        self.plot_mode = plot
+        self.plot_points = plot_points
+        # Fast runs (optimization trials) keep no trade log, history, plots or equity curve
+        self.fast = fast
+        if fast:
+            self.trade_log_format = "none"
+            self.plot_mode = "none"
+        self.trade_history = TradeTally() if fast else TradeStore()
         self.short_atr_window = 60
         self.last_valid_atr = 1.0 
         self.minimum_grid_size = minimum_grid_size 
@@ -43,9 +164,16 @@ class DynamicGridBacktest:
         self.max_loss = max_loss
         self.take_profit_factor = take_profit_factor
         self.daily_atr = None  
+        self.opening_atr = None
+        self.engine = engine
+        self.session_calendar = session_calendar or SessionCalendar()
         self.current_pivot = None  
+        self.rolling_atr = RollingATR(self.short_atr_window)
+        # Bumped whenever results can change; calculate_performance_metrics caches per version
+        self.run_version = 0
+        self.metrics_cache = None
 
-    def calculate_grid(self, current_price, current_atr, prices, index):
+    def calculate_grid(self, current_price, current_atr, index):
         if pd.isna(current_atr):
             print(f"Warning: current_atr is nan at index {index}, using last valid ATR: {self.last_valid_atr}")
             current_atr = self.last_valid_atr
@@ -54,11 +182,11 @@ class DynamicGridBacktest:
         grid_size = max(self.grid_size_factor * current_atr, self.minimum_grid_size)
         grid_size = min(grid_size, 10)  
         size_per_level = 1
-        total_open_contracts = sum(p[2] for p in self.positions)
+        total_open_contracts = self.positions.total_size
         if total_open_contracts + size_per_level > self.max_contracts:
             size_per_level = 0
         if index >= self.short_atr_window:
-            short_atr = calculate_atr(prices[:index + 1], window=self.short_atr_window, last_valid_atr=self.last_valid_atr)
+            short_atr = self.rolling_atr.value(self.last_valid_atr)
             if pd.isna(short_atr):
                 short_atr = self.last_valid_atr
             grid_size = max(grid_size, short_atr * self.grid_size_factor)
@@ -66,115 +194,202 @@ class DynamicGridBacktest:
         return grid_size, size_per_level
 
     def log_trade(self, timestamp, trade_type, price, size, profit=None, fee=None):
-        with open(self.log_file, "a") as f:
-            profit_str = f"{profit:,.0f}" if profit is not None else "N/A"
-            fee_str = f"{fee:,.0f}" if fee is not None else "N/A"
-            f.write(f"{timestamp},{trade_type},{price:.1f},{size:.4f},{profit_str},{fee_str}\n")
+        self.trade_log_sink.write(timestamp, trade_type, price, size, profit, fee)
 
     def is_trading_time(self, timestamp):
-        trading_start = time(9, 0)
-        trading_end = time(14, 29)
-        current_time = timestamp.time()
-        return trading_start <= current_time <= trading_end
+        return self.session_calendar.is_trading_time(timestamp)
 
     def is_end_of_day(self, timestamp):
-        end_start = time(14, 29)
-        end_close = time(14, 30)
-        current_time = timestamp.time()
-        return end_start <= current_time <= end_close
-
-    def check_daily_fee(self, timestamp, fee):
-        current_date = timestamp.date()
-        if self.last_date != current_date:
-            self.daily_fee = 0
-            self.last_date = current_date
-        self.daily_fee += fee if fee is not None else 0
-        return self.daily_fee > self.daily_fee_limit
+        return self.session_calendar.is_end_of_day(timestamp)
 
     def apply_overnight_fee(self, timestamp):
         if self.positions:
+            self.run_version += 1
             overnight_fee_per_position = 2550 
             total_overnight_fee = len(self.positions) * overnight_fee_per_position
             self.capital -= total_overnight_fee
             self.log_trade(timestamp, "OVERNIGHT_FEE", 0, len(self.positions), profit=0, fee=total_overnight_fee)
-            self.trade_history.append((timestamp, "OVERNIGHT_FEE", 0, len(self.positions), 0, total_overnight_fee))
+            self.trade_history.append(timestamp, "OVERNIGHT_FEE", 0, len(self.positions), 0, total_overnight_fee)
 
-    def backtest(self, prices):
+    def backtest(self, prices, progress=None):
         """
-        Run backtest on the given price series
+        Run backtest on the given price series. progress, if given, is called
+        as progress(date, equity) at the end of each date with that date's
+        closing equity; an exception raised from it stops the backtest.
         """
         if prices is None or prices.empty:
             print("No data available for backtest.")
             return None
 
-        self.equity_series = pd.Series(index=prices.index)
-        self.equity_series.iloc[0] = self.capital
-
-        with open(self.log_file, "w") as f:
-            f.write("Trade Log - Dynamic Grid Trading (6 Levels, Size=1, with Take Profit)\n")
-            f.write("Time,Type,Price,Size,Profit,Fee\n")
+        self.run_version += 1
+        self.trade_log_sink = create_trade_log_sink(self.trade_log_format, self.log_file, self.trade_log_buffer)
+        self.trade_log_sink.open()
 
         self.current_pivot = prices.iloc[0]  
+        self.rolling_atr = RollingATR(self.short_atr_window)
+        self.rolling_atr.update(self.current_pivot)
         self.last_date = prices.index[0].date()
-        last_data_date = prices.index[-1].date()  
-        grid_size = None
-        size = 0
-        for i in range(1, len(prices)):
-            if i % 10000 == 0:
-                print(f"Processing {i / len(prices) * 100:.2f}%")
+        self.opening_atr = calculate_opening_atr(prices)
+        self.equity_series = None
+        self.equity_blocks = None
+
+        try:
+            if self.engine == "numba":
+                completed = self._run_kernel(prices, progress)
+            elif self.engine == "numpy":
+                completed = self._run_arrays(prices, progress=progress)
+            elif self.engine == "events":
+                completed = self._run_arrays(prices, skip_inert=True, progress=progress)
+            else:
+                completed = self._run_pandas(prices, progress)
+        finally:
+            self.trade_log_sink.close()
+        if self.fast:
+            equity_blocks, self.equity_blocks = self.equity_blocks, None
+            return self._fast_metrics(equity_blocks, prices.index.name) if completed else None
+        if not completed:
+            return None
+        return self.calculate_performance_metrics()
 
-            current_price = prices.iloc[i]
-        
-            timestamp = prices.index[i]
-            current_date = timestamp.date()
-
-            if current_date != self.last_date:
-                self.apply_overnight_fee(timestamp)  
-                self.last_date = current_date
-
-            if self.daily_atr is None and self.is_trading_time(timestamp):
-                start_time = pd.Timestamp.combine(current_date, time(8, 45))
-                end_time = pd.Timestamp.combine(current_date, time(9, 0))
-                daily_initial_data = prices[(prices.index >= start_time) & (prices.index < end_time)]
-                if len(daily_initial_data) >= 2:
-                    self.daily_atr = calculate_atr(daily_initial_data, window=len(daily_initial_data))
-                else:
-                    self.daily_atr = self.last_valid_atr 
+    def _report_day(self, progress, timestamps, equity, start, stop):
+        """
+        Pass the date of ticks start..stop-1 and its last marked equity to progress
+        """
+        if isinstance(equity, EquityBlocks):
+            closing = equity.last_marked(start)
+        else:
+            marked = np.asarray(equity[start:stop], dtype=np.float64)
+            marked = marked[~np.isnan(marked)]
+            closing = float(marked[-1]) if len(marked) else None
+        if closing is not None:
+            progress(timestamps[start].date(), closing)
 
-            if self.daily_atr is not None and self.is_trading_time(timestamp):
+    def _equity_store(self, timestamps, epoch_ns=None):
+        """
+        Array the equity of each tick is written to, or in fast mode an
+        EquityBlocks (kept as equity_blocks) that folds it in as it goes
+        """
+        if self.fast:
+            if epoch_ns is None:
+                epoch_ns = timestamps.values.astype("datetime64[ns]", copy=False).view(np.int64)
+            self.equity_blocks = EquityBlocks(epoch_ns)
+            equity = self.equity_blocks
+        else:
+            equity = np.full(len(timestamps), np.nan)
+        equity[0] = self.capital
+        return equity
+
+    def _run_pandas(self, prices, progress=None):
+        """
+        Reference tick loop reading prices and timestamps through pandas
+        """
+        if self.fast:
+            equity = self._equity_store(prices.index)
+        else:
+            self.equity_series = pd.Series(index=prices.index)
+            self.equity_series.iloc[0] = self.capital
+            equity = self.equity_series.iloc
+        flags = self.session_calendar.flags(prices.index)
+        return self._run_ticks(prices.index, prices.iloc, flags, equity, lambda grid_state: range(1, len(prices)),
+                               progress)
+
+    def _run_arrays(self, prices, skip_inert=False, progress=None):
+        """
+        Same tick loop as _run_pandas, over arrays decoded once up front.
+        With skip_inert, only the ticks found by _actionable_ticks run
+        through the loop body.
+        """
+        values = prices.to_numpy(dtype=np.float64)
+        timestamps = prices.index
+        n = len(values)
+        equity = self._equity_store(timestamps)
+        price_list = values.tolist()
+        flags = self.session_calendar.flags(timestamps)
+
+        # Keep hot-loop state in Python floats; np.float64 scalar arithmetic is far slower
+        self.current_pivot = price_list[0]
+        if skip_inert:
+            # The generator resumes after each loop body, so it reads the grid as just updated
+            ticks = lambda grid_state: self._actionable_ticks(values, flags, equity, grid_state, progress is not None)
+        else:
+            ticks = lambda grid_state: range(1, n)
+        completed = self._run_ticks(timestamps, price_list, [flag.tolist() for flag in flags], equity, ticks,
+                                    progress)
+
+        if skip_inert and completed:
+            # Skipped date changes still move the date the loop body would have recorded
+            self.last_date = timestamps[-1].date()
+        if not self.fast:
+            self.equity_series = pd.Series(equity, index=timestamps)
+        return completed
+
+    def _run_ticks(self, timestamps, prices, flags, equity, ticks, progress=None):
+        """
+        The tick loop shared by the pandas, numpy and events engines. prices
+        and equity are indexed by tick position (equity is written to), flags
+        are the session flags of the ticks and ticks(grid_state) yields the
+        ticks to run, grid_state returning the current grid size and size.
+        Returns False if the capital ran out.
+        """
+        trading_flags, end_of_day_flags, new_day_flags, final_close_flags = flags
+        n = len(timestamps)
+        grid_size = None
+        size = 0
+        completed = True
+        day_start = 0
+        for i in ticks(lambda: (grid_size, size)):
+            if i % 10000 == 0 and not self.fast:
+                print(f"Processing {i / n * 100:.2f}%")
+
+            current_price = prices[i]
+            self.rolling_atr.update(current_price)
+            trading = trading_flags[i]
+            end_of_day = end_of_day_flags[i]
+
+            if new_day_flags[i]:
+                if progress is not None:
+                    self._report_day(progress, timestamps, equity, day_start, i)
+                    day_start = i
+                self.apply_overnight_fee(timestamps[i])
+                self.last_date = timestamps[i].date()
+
+            if self.daily_atr is None and trading:
+                self.daily_atr = float(self.opening_atr.get(timestamps[i].date(), self.last_valid_atr))
+
+            if self.daily_atr is not None and trading:
                 current_atr = self.daily_atr
             else:
                 current_atr = self.last_valid_atr 
 
-            if current_date == last_data_date and timestamp.time() >= time(14, 29) and self.positions:
-                self.close_all_positions(current_price, timestamp)
-                self.equity_series.iloc[i] = self.capital
+            if final_close_flags[i] and self.positions:
+                self.close_all_positions(current_price, timestamps[i])
+                equity[i] = self.capital
                 continue
 
-            if not self.is_trading_time(timestamp) and not self.is_end_of_day(timestamp) and self.positions:
+            if not trading and not end_of_day and self.positions:
                 continue
 
-            if not self.is_trading_time(timestamp) or self.is_end_of_day(timestamp):
-                self.equity_series.iloc[i] = self.capital
+            if not trading or end_of_day:
+                equity[i] = self.capital
                 continue
 
             if grid_size is None:
-                grid_size, size = self.calculate_grid(current_price, current_atr, prices, i)
+                grid_size, size = self.calculate_grid(current_price, current_atr, i)
             buypivot = self.current_pivot - self.move_pivot * grid_size
             sellpivot = self.current_pivot + self.move_pivot * grid_size
 
             if current_price < buypivot or current_price > sellpivot:
-                self.close_all_positions(current_price, timestamp)
+                self.close_all_positions(current_price, timestamps[i])
                 self.current_pivot = current_price 
-                current_atr=calculate_atr(prices[:i + 1], window=self.short_atr_window, last_valid_atr=self.last_valid_atr)
-                grid_size, size = self.calculate_grid(current_price, current_atr, prices, i)
+                current_atr = self.rolling_atr.value(self.last_valid_atr)
+                grid_size, size = self.calculate_grid(current_price, current_atr, i)
 
             self.max_loss_per_trade = 500000 * self.max_loss
             forced_close_triggered = False
 
             take_profit = self.take_profit_factor*grid_size * self.contract_value
-            for pos in self.positions[:]:
-                side, entry_price, size_pos = pos
+            for slot in self.positions.slots():
+                side, entry_price, size_pos = self.positions.position(slot)
                 if side == "BUY":
                     profit = (current_price - entry_price) * size_pos * self.contract_value
                     if profit >= take_profit:
@@ -182,9 +397,9 @@ class DynamicGridBacktest:
                         fee = self.fee_per_trade * self.contract_value
                         profit = profit_before_fee - fee
                         self.capital += profit
-                        self.positions.remove(pos)
-                        self.log_trade(timestamp, "TAKE_PROFIT_BUY", current_price, size_pos, profit, fee)
-                        self.trade_history.append((timestamp, "TAKE_PROFIT_BUY", current_price, size_pos, profit, fee))
+                        self.positions.close(slot)
+                        self.log_trade(timestamps[i], "TAKE_PROFIT_BUY", current_price, size_pos, profit, fee)
+                        self.trade_history.append(timestamps[i], "TAKE_PROFIT_BUY", current_price, size_pos, profit, fee)
                         continue
                 else: 
                     profit = (entry_price - current_price) * size_pos * self.contract_value
@@ -193,179 +408,342 @@ class DynamicGridBacktest:
                         fee = self.fee_per_trade * self.contract_value
                         profit = profit_before_fee - fee
                         self.capital += profit
-                        self.positions.remove(pos)
-                        self.log_trade(timestamp, "TAKE_PROFIT_SELL", current_price, size_pos, profit, fee)
-                        self.trade_history.append((timestamp, "TAKE_PROFIT_SELL", current_price, size_pos, profit, fee))
+                        self.positions.close(slot)
+                        self.log_trade(timestamps[i], "TAKE_PROFIT_SELL", current_price, size_pos, profit, fee)
+                        self.trade_history.append(timestamps[i], "TAKE_PROFIT_SELL", current_price, size_pos, profit, fee)
                         continue
 
                 if side == "BUY":
                     loss = (entry_price - current_price) * size_pos * self.contract_value if current_price < entry_price else 0
                     if loss >= self.max_loss_per_trade:
-                        self.close_all_positions(current_price, timestamp)
+                        self.close_all_positions(current_price, timestamps[i])
                         self.current_pivot = current_price 
-                        current_atr=calculate_atr(prices[:i + 1], window=self.short_atr_window, last_valid_atr=self.last_valid_atr)
-                        grid_size, size = self.calculate_grid(current_price, current_atr, prices, i)
-                        print(f"Max loss triggered for BUY at {timestamp}, closing all positions and moving pivot.")
+                        current_atr = self.rolling_atr.value(self.last_valid_atr)
+                        grid_size, size = self.calculate_grid(current_price, current_atr, i)
+                        if not self.fast:
+                            print(f"Max loss triggered for BUY at {timestamps[i]}, closing all positions and moving pivot.")
                         forced_close_triggered = True
                         break
                 else: 
                     loss = (current_price - entry_price) * size_pos * self.contract_value if current_price > entry_price else 0
                     if loss >= self.max_loss_per_trade:
-                        self.close_all_positions(current_price, timestamp)
-                        current_atr=calculate_atr(prices[:i + 1], window=self.short_atr_window, last_valid_atr=self.last_valid_atr)
+                        self.close_all_positions(current_price, timestamps[i])
+                        current_atr = self.rolling_atr.value(self.last_valid_atr)
                         self.current_pivot = current_price 
-                        grid_size, size = self.calculate_grid(current_price, current_atr, prices, i)
-                        print(f"Max loss triggered for SELL at {timestamp}, closing all positions and moving pivot.")
+                        grid_size, size = self.calculate_grid(current_price, current_atr, i)
+                        if not self.fast:
+                            print(f"Max loss triggered for SELL at {timestamps[i]}, closing all positions and moving pivot.")
                         forced_close_triggered = True
                         break
 
-            if len(self.positions) < self.max_positions and size > 0 and not self.check_daily_fee(timestamp, 0) and not forced_close_triggered:
-                num_buys = len([p for p in self.positions if p[0] == "BUY"])
-                num_sells = len([p for p in self.positions if p[0] == "SELL"])
+            if len(self.positions) < self.max_positions and size > 0 and not self.daily_fee > self.daily_fee_limit and not forced_close_triggered:
+                num_buys = self.positions.count("BUY")
+                num_sells = self.positions.count("SELL")
                 max_buys = 6  
                 max_sells = 6  
 
-                for n in range(1, 7):
-                    buy_level = round(self.current_pivot - (n-0.5) * grid_size, 1)
-                    sell_level = round(self.current_pivot + (n-0.5) * grid_size, 1)
+                for n_level in range(1, 7):
+                    buy_level = round_level(self.current_pivot - (n_level-0.5) * grid_size)
+                    sell_level = round_level(self.current_pivot + (n_level-0.5) * grid_size)
 
-                    if num_buys < max_buys and current_price <= buy_level and not any(p[0] == "BUY" and abs(p[1] - current_price) < grid_size * 0.5 for p in self.positions):
-                        self.positions.append(("BUY", current_price, size))
-                        self.trades.append(("BUY", current_price, current_price, size))
-                        self.log_trade(timestamp, "BUY", current_price, size, fee=0)
-                        self.trade_history.append((timestamp, "BUY", current_price, size, 0, 0))
+                    if num_buys < max_buys and current_price <= buy_level and not self.positions.has_near("BUY", current_price, grid_size * 0.5):
+                        buy_slot = self.positions.open("BUY", current_price, size)
+                        self.log_trade(timestamps[i], "BUY", current_price, size, fee=0)
+                        self.trade_history.append(timestamps[i], "BUY", current_price, size, 0, 0)
                         num_buys += 1  
 
-                        sell_positions = [p for p in self.positions if p[0] == "SELL"]
-                        if sell_positions:
-                            sell_pos = sell_positions[0]
-                            profit_before_fee = (sell_pos[1] - current_price) * size * self.contract_value
+                        sell_slot = self.positions.first("SELL")
+                        if sell_slot is not None:
+                            profit_before_fee = (self.positions.entries[sell_slot] - current_price) * size * self.contract_value
                             fee = self.fee_per_trade * self.contract_value
                             profit = profit_before_fee - fee
                             self.capital += profit
-                            self.positions.remove(sell_pos)
-                            self.positions.remove(("BUY", current_price, size))
-                            self.log_trade(timestamp, "CLOSE_PAIR", current_price, size, profit, fee)
-                            self.trade_history.append((timestamp, "CLOSE_PAIR", current_price, size, profit, fee))
+                            self.positions.close(sell_slot)
+                            self.positions.close(buy_slot)
+                            self.log_trade(timestamps[i], "CLOSE_PAIR", current_price, size, profit, fee)
+                            self.trade_history.append(timestamps[i], "CLOSE_PAIR", current_price, size, profit, fee)
                             num_buys -= 1  
                             num_sells -= 1  
                             continue
                     
-                    if num_sells < max_sells and current_price >= sell_level and not any(p[0] == "SELL" and abs(p[1] - current_price) < grid_size * 0.5 for p in self.positions):
-                        self.positions.append(("SELL", current_price, size))
-                        self.trades.append(("SELL", current_price, current_price, size))
-                        self.log_trade(timestamp, "SELL", current_price, size, fee=0)
-                        self.trade_history.append((timestamp, "SELL", current_price, size, 0, 0))
+                    if num_sells < max_sells and current_price >= sell_level and not self.positions.has_near("SELL", current_price, grid_size * 0.5):
+                        sell_slot = self.positions.open("SELL", current_price, size)
+                        self.log_trade(timestamps[i], "SELL", current_price, size, fee=0)
+                        self.trade_history.append(timestamps[i], "SELL", current_price, size, 0, 0)
                         num_sells += 1  
 
-                        buy_positions = [p for p in self.positions if p[0] == "BUY"]
-                        if buy_positions:
-                            buy_pos = buy_positions[0]
-                            profit_before_fee = (current_price - buy_pos[1]) * size * self.contract_value
+                        buy_slot = self.positions.first("BUY")
+                        if buy_slot is not None:
+                            profit_before_fee = (current_price - self.positions.entries[buy_slot]) * size * self.contract_value
                             fee = self.fee_per_trade * self.contract_value
                             profit = profit_before_fee - fee
                             self.capital += profit
-                            self.positions.remove(buy_pos)
-                            self.positions.remove(("SELL", current_price, size))
-                            self.log_trade(timestamp, "CLOSE_PAIR", current_price, size, profit, fee)
-                            self.trade_history.append((timestamp, "CLOSE_PAIR", current_price, size, profit, fee))
+                            self.positions.close(buy_slot)
+                            self.positions.close(sell_slot)
+                            self.log_trade(timestamps[i], "CLOSE_PAIR", current_price, size, profit, fee)
+                            self.trade_history.append(timestamps[i], "CLOSE_PAIR", current_price, size, profit, fee)
                             num_buys -= 1 
                             num_sells -= 1  
                             continue
 
-            current_equity = self.capital + sum((p[1] - current_price) * p[2] * self.contract_value if p[0] == "SELL" 
-                                            else (current_price - p[1]) * p[2] * self.contract_value 
-                                            for p in self.positions)
-            self.equity_series.iloc[i] = current_equity
+            current_equity = self.capital + self.positions.mark_to_market(current_price)
+            equity[i] = current_equity
 
             if self.capital < 0:
-                return None
-            if i == len(prices) - 1 and self.positions:
-                self.close_all_positions(current_price, timestamp)
-                self.equity_series.iloc[i] = self.capital
-        
-        return self.calculate_performance_metrics()
+                completed = False
+                break
+            if i == n - 1 and self.positions:
+                self.close_all_positions(current_price, timestamps[i])
+                equity[i] = self.capital
+
+        if progress is not None and completed:
+            self._report_day(progress, timestamps, equity, day_start, n)
+        return completed
+
+    def _actionable_ticks(self, values, flags, equity, grid_state, every_day=False):
+        """
+        Yield, in order, the ticks at which the _run_ticks loop body can
+        change the backtest state, given the state left by the previous one.
+        For the inert ticks in between, equity is filled and the rolling ATR
+        advanced in bulk, exactly as the loop body would have done.
+
+        A tick is actionable if it is the last one, starts a new date or
+        falls in the final close-out while positions are open, sets the
+        daily ATR or first grid, or, inside a session, crosses the pivot
+        reset bounds, a position's take-profit or max-loss, or the nearest
+        open buy / sell grid level away from existing entries. Each check
+        evaluates the loop body's own expressions over a window of upcoming
+        prices, which doubles while nothing is found. With every_day, the
+        first tick of each date is always actionable.
+        """
+        trading, end_of_day, new_day, final_close = flags
+        active = trading & ~end_of_day
+        idle = ~trading & ~end_of_day
+        n = len(values)
+        i = 1
+        window = 64
+        while i < n:
+            # The last tick always runs the loop body, which closes what is still open
+            hi = min(i + window, n - 1)
+            grid_size, size = grid_state()
+            j = self._next_actionable(values, trading, active, new_day, final_close, i, hi, grid_size, size, every_day)
+
+            prices = values[i:j]
+            positions = self.positions
+            skipped = np.where(active[i:j],
+                               self.capital + (positions.net_quantity * prices * self.contract_value
+                                               - positions.entry_notional),
+                               self.capital)
+            if positions:
+                # The loop body leaves equity unset outside the session while positions are open
+                skipped[idle[i:j]] = np.nan
+            equity[i:j] = skipped
+            self.rolling_atr.update_many(prices)
+
+            if j == hi and hi < n - 1:
+                i = hi
+                window = min(window * 2, 1 << 16)
+                continue
+            yield j
+            i = j + 1
+            window = 64
+
+    def _next_actionable(self, values, trading, active, new_day, final_close, lo, hi, grid_size, size, every_day=False):
+        """
+        First index in [lo, hi) at which the loop body would do more than mark
+        equity, or hi if there is none
+        """
+        prices = values[lo:hi]
+        hit = np.zeros(hi - lo, dtype=np.bool_)
+        if self.positions:
+            hit |= new_day[lo:hi] | final_close[lo:hi]
+        elif every_day:
+            # The loop body reports progress at each new date
+            hit |= new_day[lo:hi]
+        if self.daily_atr is None:
+            hit |= trading[lo:hi]
+        if grid_size is None:
+            hit |= active[lo:hi]
+        else:
+            buypivot = self.current_pivot - self.move_pivot * grid_size
+            sellpivot = self.current_pivot + self.move_pivot * grid_size
+            action = (prices < buypivot) | (prices > sellpivot)
+
+            take_profit = self.take_profit_factor*grid_size * self.contract_value
+            max_loss_per_trade = 500000 * self.max_loss
+            for side, entry_price, size_pos in self.positions:
+                if side == "BUY":
+                    profit = (prices - entry_price) * size_pos * self.contract_value
+                    loss = np.where(prices < entry_price, (entry_price - prices) * size_pos * self.contract_value, 0)
+                else:
+                    profit = (entry_price - prices) * size_pos * self.contract_value
+                    loss = np.where(prices > entry_price, (prices - entry_price) * size_pos * self.contract_value, 0)
+                action |= (profit >= take_profit) | (loss >= max_loss_per_trade)
+
+            if len(self.positions) < self.max_positions and size > 0 and not self.daily_fee > self.daily_fee_limit:
+                # Grid levels only move away from the pivot, so the first level decides
+                # whether any level opens a position
+                sides = (
+                    ("BUY", prices <= round_level(self.current_pivot - 0.5 * grid_size)),
+                    ("SELL", prices >= round_level(self.current_pivot + 0.5 * grid_size)),
+                )
+                for side, opening in sides:
+                    if self.positions.count(side) >= 6:
+                        continue
+                    for slot in self.positions.side_slots[side]:
+                        opening &= ~(np.abs(self.positions.entries[slot] - prices) < grid_size * 0.5)
+                    action |= opening
+            hit |= active[lo:hi] & action
+        found = np.flatnonzero(hit)
+        return lo + found[0] if len(found) else hi
+
+    def _run_kernel(self, prices, progress=None):
+        """
+        Run the compiled grid kernel, then replay its events into the trade log and history
+        """
+        values, epoch_ns, days, _ = price_arrays(prices)
+        trading, end_of_day, new_day, final_close = self.session_calendar.flags(prices.index)
+        timestamps = prices.index
+        n = len(values)
+        equity = self._equity_store(timestamps, epoch_ns)
+        opening_days = pd.to_datetime(self.opening_atr.index).values.astype("datetime64[D]").astype(np.int32)
+        opening_values = self.opening_atr.to_numpy(dtype=np.float64)
+
+        sides = np.zeros(self.max_positions + 1, dtype=np.int8)
+        entries = np.zeros(self.max_positions + 1)
+        sizes = np.zeros(self.max_positions + 1)
+        for slot, (side, entry_price, size) in enumerate(self.positions):
+            sides[slot] = SIDE_BUY if side == "BUY" else SIDE_SELL
+            entries[slot] = entry_price
+            sizes[slot] = size
+        day_start = 0
+
+        def report(stop):
+            nonlocal day_start
+            self._report_day(progress, timestamps, equity, day_start, stop)
+            day_start = stop
+
+        result = run_grid_kernel(
+            values, days, trading, end_of_day, new_day, final_close, opening_days, opening_values, equity,
+            np.empty(max(1024, n // 64), dtype=EVENT_DTYPE), sides, entries, sizes,
+            len(self.positions), float(self.positions.net_quantity), float(self.positions.entry_notional),
+            float(self.capital), float(self.last_valid_atr),
+            np.nan if self.daily_atr is None else float(self.daily_atr), float(self.contract_value),
+            float(self.fee_per_trade), float(self.grid_size_factor), float(self.minimum_grid_size),
+            float(self.move_pivot), float(self.max_loss), float(self.take_profit_factor), self.max_positions,
+            float(self.max_contracts), float(self.daily_fee), float(self.daily_fee_limit), self.short_atr_window,
+            report if progress is not None else None)
+        completed, events, n_events, count, capital, current_pivot, last_valid_atr, daily_atr = result
+
+        self.capital = capital
+        self.current_pivot = current_pivot
+        self.last_valid_atr = last_valid_atr
+        self.daily_atr = None if np.isnan(daily_atr) else daily_atr
+        self.positions.clear()
+        for slot in range(count):
+            self.positions.open("BUY" if sides[slot] == SIDE_BUY else "SELL", entries[slot], sizes[slot])
+
+        events = events[:n_events]
+        trades = events[events['event'] < MAX_LOSS_BUY]
+        self.trade_history.extend(epoch_ns[trades['index']], trades['event'], trades['price'], trades['size'],
+                                  trades['profit'], trades['fee'])
+        # Fast runs have neither a trade log nor console output to replay into
+        for index, code, price, size, profit, fee in ([] if self.fast else events.tolist()):
+            timestamp = timestamps[index]
+            if code >= MAX_LOSS_BUY:
+                side = "BUY" if code == MAX_LOSS_BUY else "SELL"
+                print(f"Max loss triggered for {side} at {timestamp}, closing all positions and moving pivot.")
+            elif code == BUY or code == SELL:
+                self.log_trade(timestamp, EVENT_NAMES[code], price, size, fee=0)
+            else:
+                self.log_trade(timestamp, EVENT_NAMES[code], price, size, profit, fee)
+
+        if not self.fast:
+            self.equity_series = pd.Series(equity, index=timestamps)
+        return completed
+
+    def exposure(self, price=None):
+        """
+        Snapshot of the open position aggregates for risk reporting, valued
+        at price when one is given
+        """
+        snapshot = {
+            'positions': len(self.positions),
+            'long_positions': self.positions.count("BUY"),
+            'short_positions': self.positions.count("SELL"),
+            'gross_quantity': self.positions.total_size,
+            'net_quantity': self.positions.net_quantity,
+            'entry_notional': self.positions.entry_notional,
+            'capital': self.capital
+        }
+        if price is not None:
+            unrealized_pnl = self.positions.mark_to_market(price)
+            snapshot['market_value'] = self.positions.net_quantity * price * self.contract_value
+            snapshot['unrealized_pnl'] = unrealized_pnl
+            snapshot['equity'] = self.capital + unrealized_pnl
+        return snapshot
 
     def close_all_positions(self, current_price, timestamp):
+        self.run_version += 1
         total_profit = 0
         total_fee = 0
-        for pos in self.positions[:]:
-            side, entry_price, size = pos
+        for slot in self.positions.slots():
+            side, entry_price, size = self.positions.close(slot)
             profit_before_fee = (current_price - entry_price if side == "BUY" else entry_price - current_price) * size * self.contract_value
             fee = self.fee_per_trade * self.contract_value
             profit = profit_before_fee - fee
             self.capital += profit
-            self.positions.remove(pos)
             self.log_trade(timestamp, f"CLOSE_{side}", current_price, size, profit, fee)
-            self.trade_history.append((timestamp, f"CLOSE_{side}", current_price, size, profit, fee))
+            self.trade_history.append(timestamp, f"CLOSE_{side}", current_price, size, profit, fee)
             total_profit += profit
             total_fee += fee
         if total_fee > 0:
             self.log_trade(timestamp, "TOTAL_FEE", current_price, 0, profit=0, fee=total_fee)
-            self.trade_history.append((timestamp, "TOTAL_FEE", current_price, 0, 0, total_fee))
+            self.trade_history.append(timestamp, "TOTAL_FEE", current_price, 0, 0, total_fee)
         return total_profit
 
     def calculate_performance_metrics(self):
         """
-        Calculate performance metrics based on backtest results
+        Calculate performance metrics based on backtest results, reusing the
+        result computed for the current run_version
         """
-        equity = self.equity_series.dropna()
-        if equity.empty:
-            print("Equity series is empty.")
+        if self.metrics_cache is not None and self.metrics_cache[0] == self.run_version:
+            return self.metrics_cache[1]
+        if self.equity_series is None:
             return None
+        metrics = performance_metrics(self.equity_series, self.trade_history.opened_volume(), self.contract_value,
+                                      self.capital)
+        self.metrics_cache = (self.run_version, metrics)
+        return metrics
 
-        hpr = (equity.iloc[-1] / equity.iloc[0] - 1) * 100
-        days = (equity.index[-1] - equity.index[0]).days
-        annual_return = ((1 + hpr / 100) ** (252 / days) - 1) * 100
-        rolling_max = equity.cummax()
-        drawdowns = (equity - rolling_max) / rolling_max * 100
-        max_drawdown = drawdowns.min()
-
-        in_drawdown = drawdowns < 0
-        drawdown_changes = in_drawdown != in_drawdown.shift().fillna(False)
-        drawdown_periods = drawdown_changes.cumsum()
-        drawdown_durations = []
-        for period in drawdown_periods[in_drawdown].unique():
-            period_indices = equity.index[drawdown_periods == period]
-            if len(period_indices) > 0:
-                duration = (period_indices[-1] - period_indices[0]).days
-                drawdown_durations.append(duration)
-        longest_drawdown = max(drawdown_durations) if drawdown_durations else 0
-
-        total_volume = sum(abs(trade[3]) for trade in self.trades)
-        turnover_ratio = (total_volume * self.contract_value / self.capital) * 100
-
-        daily_returns = self.equity_series.dropna().resample('D').last().pct_change().dropna()
-        sharpe_std = daily_returns.std()
-        sharpe_ratio = np.sqrt(252) * daily_returns.mean() / sharpe_std if sharpe_std != 0 else 0
-
-        downside_returns = daily_returns[daily_returns < 0]
-        downside_std = downside_returns.std() if not downside_returns.empty else 0
-        sortino_ratio = np.sqrt(252) * daily_returns.mean() / downside_std if downside_std != 0 else 0
-
-        return {
-            'hpr': hpr,
-            'annual_return': annual_return,
-            'max_drawdown': max_drawdown,
-            'longest_drawdown': longest_drawdown,
-            'turnover_ratio': turnover_ratio,
-            'sharpe_ratio': sharpe_ratio,
-            'sortino_ratio': sortino_ratio,
-            'daily_returns': daily_returns,
-            'final_capital': equity.iloc[-1],
-            'equity_series': equity
-        }
+    def _fast_metrics(self, equity_blocks, index_name=None):
+        """
+        Metrics of a fast run from the EquityBlocks its equity was folded
+        into, so the result has no 'equity_series'
+        """
+        turnover = self.trade_history.opened_volume() * self.contract_value / self.capital
+        return equity_blocks.metrics(turnover, index_name)
 
-    def print_results(self, output_dir=None):
+    def equity_record(self):
         """
-        Print and optionally save backtest results
+        Equity curve of the last run at the configured equity resolution
         """
-        metrics = self.calculate_performance_metrics()
+        return self.equity_recorder.record(self.equity_series, self.trade_history.column('timestamp'))
+
+    def print_results(self, output_dir=None, metrics=None):
+        """
+        Print and optionally save backtest results, from metrics when the
+        caller already has them
+        """
+        if self.fast:
+            raise ValueError("print_results needs a full run: fast runs keep no trade history or equity curve")
+        if metrics is None:
+            metrics = self.calculate_performance_metrics()
         if metrics is None:
             print("Cannot calculate performance metrics due to missing data.")
             return
 
-        total_trades = len(self.trades)
+        total_trades = int(self.trade_history.select("BUY", "SELL").sum())
         total_profit = metrics['equity_series'].iloc[-1] - metrics['equity_series'].iloc[0]
 
         results = [
@@ -378,7 +756,7 @@ class DynamicGridBacktest:
             f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}",
             f"Sortino Ratio: {metrics['sortino_ratio']:.2f}",
             f"Final capital: {metrics['final_capital']:,.0f} VND",
-            f"Trade log saved to: {self.log_file}"
+            f"Trade log saved to: {self.trade_log_sink.path}" if self.trade_log_sink.path else "Trade log disabled"
         ]
         
         # Print results to console
@@ -396,22 +774,15 @@ class DynamicGridBacktest:
                     f.write(line + "\n")
             
             # Plot equity curve
-            plt.plot(metrics['equity_series'])
-            
-            plt.title("Equity Curve")
-            plt.xlabel("Time")
-            plt.ylabel("Capital (VND)")
-            plt.grid(True)
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, 'equity_curve.png'))
+            equity_record = self.equity_record()
+            submit_plot(equity_record, os.path.join(output_dir, 'equity_curve.png'), self.plot_points, self.plot_mode)
             
             # Save trade history to CSV
-            # if self.trade_history:
-            #     trade_df = pd.DataFrame(self.trade_history, 
-            #                            columns=["Timestamp", "Type", "Price", "Size", "Profit", "Fee"])
+            # if len(self.trade_history):
+            #     trade_df = self.trade_history.to_frame()
             #     trade_df.to_csv(os.path.join(output_dir, "trade_history.csv"), index=False)
             
             # Save equity series to CSV
-            metrics['equity_series'].to_csv(os.path.join(output_dir, "equity_series.csv"))
+            equity_record.to_csv(os.path.join(output_dir, "equity_series.csv"))
             
         return metrics 
\ No newline at end of file
@@ -0,0 +1,270 @@
+import numpy as np
+import pandas as pd
+
+from session_calendar import NS_PER_DAY
+
+# Ticks of equity folded into an EquityAccumulator at a time
+EQUITY_BLOCK = 16384
+
+
+def drawdown_spells(in_drawdown):
+    """
+    Run-length encode a boolean array: first and last index (inclusive) of
+    every run of True values
+    """
+    padded = np.concatenate(([False], in_drawdown, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2] - 1
+
+
+def daily_returns(epoch_ns, values):
+    """
+    Close-to-close returns of calendar days, taking each day's last value.
+    A return is only defined when the previous calendar day has data too,
+    like resample('D').last().pct_change() without padding. Returns the
+    days (epoch ns at midnight) and the returns.
+    """
+    days = epoch_ns // NS_PER_DAY
+    last = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+    return close_to_close_returns(days[last], values[last])
+
+
+def close_to_close_returns(closing_days, closes):
+    """
+    Returns between the closes of consecutive calendar days (days since
+    epoch, ascending), with the days in epoch ns like daily_returns
+    """
+    consecutive = closing_days[1:] - closing_days[:-1] == 1
+    returns = closes[1:] / closes[:-1] - 1
+    return closing_days[1:][consecutive] * NS_PER_DAY, returns[consecutive]
+
+
+def _mean(values):
+    return values.mean() if len(values) else np.nan
+
+
+def _sample_std(values):
+    # Same as pandas' std(): NaN below two observations instead of a warning
+    return values.std(ddof=1) if len(values) > 1 else np.nan
+
+
+def annualized_sharpe(returns):
+    """
+    Annualized Sharpe ratio of daily returns (0 when they do not vary)
+    """
+    std = _sample_std(returns)
+    return np.sqrt(252) * _mean(returns) / std if std != 0 else 0
+
+
+def performance_metrics(equity_series, opened_volume, contract_value, capital):
+    """
+    Performance metrics of a tick-level equity series (NaN entries are
+    ignored). opened_volume is the total size of all opened positions,
+    used with capital for the turnover ratio.
+    """
+    equity = equity_series.dropna()
+    if equity.empty:
+        print("Equity series is empty.")
+        return None
+    values = equity.to_numpy(dtype=np.float64)
+    epoch_ns = equity.index.values.astype("datetime64[ns]").view(np.int64)
+
+    rolling_max = np.maximum.accumulate(values)
+    drawdowns = (values - rolling_max) / rolling_max * 100
+    starts, ends = drawdown_spells(drawdowns < 0)
+    durations = (epoch_ns[ends] - epoch_ns[starts]) // NS_PER_DAY
+    longest_drawdown = int(durations.max()) if len(durations) else 0
+
+    return_days, returns = daily_returns(epoch_ns, values)
+    metrics = summary_metrics(values[0], values[-1], int((epoch_ns[-1] - epoch_ns[0]) // NS_PER_DAY),
+                              drawdowns.min(), longest_drawdown, opened_volume * contract_value / capital,
+                              return_days, returns, equity.index.name)
+    metrics['equity_series'] = equity
+    return metrics
+
+
+def summary_metrics(first_equity, final_equity, days, max_drawdown, longest_drawdown, turnover,
+                    return_days, returns, index_name=None):
+    """
+    Metrics dict from quantities already reduced from the equity curve:
+    first and final equity, calendar days between them, max drawdown (%),
+    longest drawdown (days), turnover (traded notional / capital) and the
+    daily returns from daily_returns
+    """
+    hpr = (final_equity / first_equity - 1) * 100
+    annual_return = ((1 + hpr / 100) ** (252 / days) - 1) * 100
+    turnover_ratio = turnover * 100
+
+    mean_return = _mean(returns)
+    sharpe_ratio = annualized_sharpe(returns)
+
+    downside_returns = returns[returns < 0]
+    downside_std = _sample_std(downside_returns) if len(downside_returns) else 0
+    sortino_ratio = np.sqrt(252) * mean_return / downside_std if downside_std != 0 else 0
+
+    return {
+        'hpr': hpr,
+        'annual_return': annual_return,
+        'max_drawdown': max_drawdown,
+        'longest_drawdown': longest_drawdown,
+        'turnover_ratio': turnover_ratio,
+        'sharpe_ratio': sharpe_ratio,
+        'sortino_ratio': sortino_ratio,
+        'daily_returns': pd.Series(returns, index=pd.DatetimeIndex(return_days.view("datetime64[ns]"),
+                                                                   name=index_name)),
+        'final_capital': final_equity,
+    }
+
+
+class EquityAccumulator:
+    """
+    Reduces K tick-level equity curves to what performance metrics need
+    (running peak, max drawdown, longest drawdown spell, daily closes and
+    the final value) without keeping the curves. Equity arrives in blocks of
+    consecutive ticks, NaN for unmarked ticks, and each block is folded in
+    with the same array operations performance_metrics uses, so the metrics
+    come out identical.
+    """
+    def __init__(self, k, epoch_ns):
+        self.epoch_ns = epoch_ns
+        self.first_day = epoch_ns[0] // NS_PER_DAY
+        self.position = 0
+        self.peak = np.full(k, -np.inf)
+        self.max_drawdown = np.zeros(k)
+        self.longest_drawdown = np.zeros(k, dtype=np.int64)
+        # Drawdown spell still running at the end of the last block
+        self.spell_open = np.zeros(k, dtype=np.bool_)
+        self.spell_start = np.zeros(k, dtype=np.int64)
+        self.spell_end = np.zeros(k, dtype=np.int64)
+        self.daily_close = np.full((k, int(epoch_ns[-1] // NS_PER_DAY - self.first_day) + 1), np.nan)
+        self.first_equity = np.full(k, np.nan)
+        self.final_equity = np.full(k, np.nan)
+        self.last_ns = np.zeros(k, dtype=np.int64)
+
+    def add(self, block):
+        """
+        Fold in the equity of the next block.shape[1] ticks, one row per curve
+        """
+        end = self.position + block.shape[1]
+        epoch_ns = self.epoch_ns[self.position:end]
+        days = epoch_ns // NS_PER_DAY
+        for row, values in enumerate(block):
+            marked = ~np.isnan(values)
+            if marked.any():
+                self._fold(row, values[marked], epoch_ns[marked], days[marked])
+        self.position = end
+
+    def _fold(self, row, values, epoch_ns, days):
+        if np.isnan(self.first_equity[row]):
+            self.first_equity[row] = values[0]
+        rolling_max = np.maximum(np.maximum.accumulate(values), self.peak[row])
+        self.peak[row] = rolling_max[-1]
+        drawdowns = (values - rolling_max) / rolling_max * 100
+        self.max_drawdown[row] = min(self.max_drawdown[row], drawdowns.min())
+
+        starts, ends = drawdown_spells(drawdowns < 0)
+        start_ns, end_ns = epoch_ns[starts], epoch_ns[ends]
+        if self.spell_open[row]:
+            if len(starts) and starts[0] == 0:
+                start_ns[0] = self.spell_start[row]
+            else:
+                self._end_spell(row, self.spell_start[row], self.spell_end[row])
+        self.spell_open[row] = len(ends) > 0 and ends[-1] == len(values) - 1
+        if self.spell_open[row]:
+            self.spell_start[row], self.spell_end[row] = start_ns[-1], end_ns[-1]
+            start_ns, end_ns = start_ns[:-1], end_ns[:-1]
+        if len(start_ns):
+            self._end_spell(row, start_ns, end_ns)
+
+        last = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        self.daily_close[row, days[last] - self.first_day] = values[last]
+        self.final_equity[row] = values[-1]
+        self.last_ns[row] = epoch_ns[-1]
+
+    def _end_spell(self, row, start_ns, end_ns):
+        longest = np.max((end_ns - start_ns) // NS_PER_DAY)
+        self.longest_drawdown[row] = max(self.longest_drawdown[row], longest)
+
+    def metrics(self, row, turnover, index_name=None):
+        """
+        summary_metrics of one curve, once all its ticks have been added
+        """
+        if self.spell_open[row]:
+            self._end_spell(row, self.spell_start[row], self.spell_end[row])
+            self.spell_open[row] = False
+        closes = self.daily_close[row]
+        closing_days = np.flatnonzero(~np.isnan(closes))
+        return_days, returns = close_to_close_returns(closing_days + self.first_day, closes[closing_days])
+        days = int((self.last_ns[row] - self.epoch_ns[0]) // NS_PER_DAY)
+        return summary_metrics(self.first_equity[row], self.final_equity[row], days, self.max_drawdown[row],
+                               int(self.longest_drawdown[row]), turnover, return_days, returns, index_name)
+
+
+
+class EquityBlocks:
+    """
+    Stand-in for the tick-level equity array of a single run that folds it
+    into an EquityAccumulator as it is written, so the curve is never held
+    whole. Ticks are written in order, one at a time or as slices, into a
+    buffer of EQUITY_BLOCK ticks that is added to the accumulator each time
+    the writes move past it; ticks never written stay unmarked (NaN).
+    """
+    def __init__(self, epoch_ns):
+        self.accumulator = EquityAccumulator(1, epoch_ns)
+        self.n = len(epoch_ns)
+        self.buffer = np.full(EQUITY_BLOCK, np.nan)
+        # Tick index of buffer[0]
+        self.start = 0
+        # Last marked tick of the blocks already folded in
+        self.folded_index = -1
+        self.folded_value = np.nan
+
+    def __setitem__(self, key, value):
+        if key.__class__ is slice:
+            self._write_slice(key.start, key.stop, value)
+            return
+        offset = key - self.start
+        if offset >= EQUITY_BLOCK:
+            self._advance(key)
+            offset = key - self.start
+        self.buffer[offset] = value
+
+    def _write_slice(self, start, stop, values):
+        position = start
+        while position < stop:
+            if position >= self.start + EQUITY_BLOCK:
+                self._advance(position)
+            end = min(stop, self.start + EQUITY_BLOCK)
+            self.buffer[position - self.start:end - self.start] = values[position - start:end - start]
+            position = end
+
+    def _advance(self, index):
+        # Fold in every full block before the one holding index
+        while index >= self.start + EQUITY_BLOCK:
+            marked = np.flatnonzero(~np.isnan(self.buffer))
+            if len(marked):
+                self.folded_index, self.folded_value = self.start + marked[-1], self.buffer[marked[-1]]
+            self.accumulator.add(self.buffer[None, :])
+            self.buffer.fill(np.nan)
+            self.start += EQUITY_BLOCK
+
+    def last_marked(self, start):
+        """
+        Value of the last marked tick written so far if it is at or after
+        start, else None
+        """
+        marked = np.flatnonzero(~np.isnan(self.buffer))
+        if len(marked):
+            index, value = self.start + marked[-1], self.buffer[marked[-1]]
+        else:
+            index, value = self.folded_index, self.folded_value
+        return float(value) if index >= start else None
+
+    def metrics(self, turnover, index_name=None):
+        """
+        summary_metrics of the curve, once all its ticks have been written
+        """
+        self._advance(self.n - 1)
+        self.accumulator.add(self.buffer[None, :self.n - self.start])
+        self.start = self.n
+        return self.accumulator.metrics(0, turnover, index_name)
@@ -0,0 +1,120 @@
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+PLOT_MODES = ("sync", "background", "none")
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = []
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points kept by largest-triangle-three-buckets
+    downsampling of (x, y) to about threshold points, plus the positions of
+    the minimum and maximum of y so extremes always survive
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Inner buckets split points 1..n-2 evenly; the first and last points are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < threshold - 1:
+            next_lo, next_hi = hi, edges[bucket + 2]
+            next_x, next_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the area of the triangle (previous point, candidate, next bucket average)
+        areas = np.abs((x[previous] - next_x) * (y[lo:hi] - y[previous])
+                       - (x[previous] - x[lo:hi]) * (next_y - y[previous]))
+        previous = lo + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return np.unique(np.concatenate([selected, [np.argmin(y), np.argmax(y)]]))
+
+
+def _bucket_range(low, high, kept):
+    """
+    Lowest low and highest high between consecutive kept indices, so a
+    shaded band over the kept points still covers every dropped point
+    """
+    bounds = np.append(kept, len(low))
+    starts = bounds[:-1]
+    return np.minimum.reduceat(low, starts), np.maximum.reduceat(high, starts)
+
+
+def plot_equity(equity_record, path, max_points=3000):
+    """
+    Save the equity curve (a Series, or an open/high/low/close DataFrame from
+    EquityRecorder) to path as a PNG, downsampled to about max_points points
+    """
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    try:
+        axes = figure.add_subplot()
+        close = equity_record['close'] if isinstance(equity_record, pd.DataFrame) else equity_record
+        x = close.index.values.astype("datetime64[ns]").view(np.int64)
+        kept = lttb(x, close.to_numpy(dtype=np.float64), max_points)
+        index = close.index[kept]
+        if isinstance(equity_record, pd.DataFrame):
+            # Shade each bucket's equity range so intra-bucket extremes stay visible
+            low, high = _bucket_range(equity_record['low'].to_numpy(), equity_record['high'].to_numpy(), kept)
+            axes.fill_between(index, low, high, alpha=0.3)
+        axes.plot(index, close.to_numpy()[kept])
+        axes.set_title("Equity Curve")
+        axes.set_xlabel("Time")
+        axes.set_ylabel("Capital (VND)")
+        axes.grid(True)
+        figure.tight_layout()
+        figure.savefig(path)
+    finally:
+        figure.clear()
+
+
+def _plot_safely(equity_record, path, max_points):
+    try:
+        plot_equity(equity_record, path, max_points)
+    except Exception as e:
+        print(f"Error plotting equity curve to {path}: {e}")
+
+
+def submit_plot(equity_record, path, max_points=3000, mode="sync"):
+    """
+    Plot now ("sync"), on a single background thread ("background", see
+    wait_for_plots) or not at all ("none")
+    """
+    global _executor
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode: {mode}")
+    if mode == "none":
+        return
+    if mode == "sync":
+        _plot_safely(equity_record, path, max_points)
+        return
+    with _executor_lock:
+        if _executor is None:
+            # One worker: matplotlib rendering is not safe to run concurrently
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plot")
+        _pending.append(_executor.submit(_plot_safely, equity_record, path, max_points))
+
+
+def wait_for_plots():
+    """
+    Block until all background plots have been written
+    """
+    with _executor_lock:
+        pending = list(_pending)
+        _pending.clear()
+    for future in pending:
+        future.result()
@@ -0,0 +1,98 @@
+class PositionBook:
+    """
+    Fixed-capacity book of open grid positions.
+
+    Each position lives in a numbered slot; slots are recycled on close. Buys
+    and sells are indexed separately in opening order, so counts, the oldest
+    position of a side and removal by slot are all O(1). Iterating the book
+    yields (side, entry_price, size) tuples, buys first, each side oldest
+    first (the grid never holds both sides between ticks).
+
+    Net signed quantity and signed entry notional (VND) are updated on every
+    open/close, so marking the book to market is O(1).
+    """
+    __slots__ = ("capacity", "contract_value", "sides", "entries", "sizes", "free_slots", "side_slots",
+                 "total_size", "net_quantity", "entry_notional")
+
+    def __init__(self, capacity=12, contract_value=100e3):
+        self.capacity = capacity
+        self.contract_value = contract_value
+        self.sides = [None] * capacity
+        self.entries = [0.0] * capacity
+        self.sizes = [0] * capacity
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        # dicts keep insertion order and give O(1) removal by key
+        self.side_slots = {"BUY": {}, "SELL": {}}
+        self.total_size = 0
+        self.net_quantity = 0
+        self.entry_notional = 0.0
+
+    def __len__(self):
+        return self.capacity - len(self.free_slots)
+
+    def __bool__(self):
+        return len(self.free_slots) != self.capacity
+
+    def __iter__(self):
+        for slot in self.slots():
+            yield self.sides[slot], self.entries[slot], self.sizes[slot]
+
+    def slots(self):
+        return list(self.side_slots["BUY"]) + list(self.side_slots["SELL"])
+
+    def position(self, slot):
+        return self.sides[slot], self.entries[slot], self.sizes[slot]
+
+    def count(self, side):
+        return len(self.side_slots[side])
+
+    def first(self, side):
+        """
+        Slot of the oldest open position on the given side, or None
+        """
+        return next(iter(self.side_slots[side]), None)
+
+    def has_near(self, side, price, distance):
+        entries = self.entries
+        return any(abs(entries[slot] - price) < distance for slot in self.side_slots[side])
+
+    def open(self, side, entry_price, size):
+        if not self.free_slots:
+            raise IndexError(f"Position book is full ({self.capacity} positions)")
+        slot = self.free_slots.pop()
+        self.sides[slot] = side
+        self.entries[slot] = entry_price
+        self.sizes[slot] = size
+        self.side_slots[side][slot] = None
+        self.total_size += size
+        signed_size = size if side == "BUY" else -size
+        self.net_quantity += signed_size
+        self.entry_notional += signed_size * entry_price * self.contract_value
+        return slot
+
+    def close(self, slot):
+        side = self.sides[slot]
+        del self.side_slots[side][slot]
+        self.sides[slot] = None
+        self.free_slots.append(slot)
+        size = self.sizes[slot]
+        self.total_size -= size
+        if len(self.free_slots) == self.capacity:
+            # Reset on an empty book so rounding in the running sums cannot build up
+            self.net_quantity = 0
+            self.entry_notional = 0.0
+        else:
+            signed_size = size if side == "BUY" else -size
+            self.net_quantity -= signed_size
+            self.entry_notional -= signed_size * self.entries[slot] * self.contract_value
+        return side, self.entries[slot], size
+
+    def clear(self):
+        for slot in self.slots():
+            self.close(slot)
+
+    def mark_to_market(self, price):
+        """
+        Unrealized PnL of all open positions at price
+        """
+        return self.net_quantity * price * self.contract_value - self.entry_notional
@@ -0,0 +1,102 @@
+import os
+import json
+import sqlite3
+import hashlib
+import numpy as np
+
+# Modules whose code determines backtest metrics; editing any of them invalidates cached results
+RESULT_MODULES = ('logic', 'positions', 'grid_kernel', 'batch_backtest', 'metrics', 'session_calendar', 'trade_store')
+
+
+def price_fingerprint(prices):
+    """
+    Content hash of a price Series: its values and timestamps
+    """
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(prices.to_numpy(dtype=np.float64)).tobytes())
+    digest.update(np.ascontiguousarray(prices.index.values.astype("datetime64[ns]").view(np.int64)).tobytes())
+    return digest.hexdigest()
+
+
+def code_version():
+    """
+    Hash of the source of RESULT_MODULES
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in RESULT_MODULES:
+        with open(os.path.join(directory, f"{name}.py"), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def scalar_metrics(metrics):
+    """
+    The scalar entries of a metrics dict as floats; an empty dict for a failed run
+    """
+    if metrics is None:
+        return {}
+    return {key: float(value) for key, value in metrics.items() if np.isscalar(value)}
+
+
+class TrialCache:
+    """
+    Persistent memo of backtest results in a SQLite file, so repeated
+    parameter sets (within a study or across launches) are not re-run.
+
+    Entries are keyed on a hash of the price data, the source of the
+    modules that compute results, the fixed settings (capital, fees,
+    session calendar, ...) and the strategy parameters. Values are the
+    scalar metrics of the run, {} for a run that failed. Several processes
+    may share the file; each opens its own connection on first use.
+    """
+    def __init__(self, path, prices, settings):
+        self.path = path
+        context = {'data': price_fingerprint(prices), 'code': code_version(), 'settings': settings}
+        self.context = hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode()).hexdigest()
+        self._connection = None
+
+    def __getstate__(self):
+        # Connections cannot cross processes; workers reconnect lazily
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS trial_results (key TEXT PRIMARY KEY, metrics TEXT NOT NULL)")
+        return self._connection
+
+    def key(self, params):
+        # Rounded floats, so 9 and 9.0 or 0.7 and 0.7000000000000001 map to the same entry
+        normalized = {name: round(float(value), 10) for name, value in params.items()}
+        return hashlib.sha256((self.context + json.dumps(normalized, sort_keys=True)).encode()).hexdigest()
+
+    def get(self, params):
+        """
+        Cached scalar metrics of params, or None if they have not been run
+        """
+        try:
+            row = self._connect().execute("SELECT metrics FROM trial_results WHERE key = ?",
+                                          (self.key(params),)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading trial cache {self.path}: {e}")
+            return None
+        return None if row is None else json.loads(row[0])
+
+    def put(self, params, metrics):
+        """
+        Store the scalar metrics of a run of params (metrics None for a failed run)
+        """
+        try:
+            with self._connect() as connection:
+                connection.execute("INSERT OR REPLACE INTO trial_results (key, metrics) VALUES (?, ?)",
+                                   (self.key(params), json.dumps(scalar_metrics(metrics))))
+        except sqlite3.Error as e:
+            print(f"Error writing trial cache {self.path}: {e}")
@@ -0,0 +1,90 @@
+import numpy as np
+from datetime import time
+
+NS_PER_DAY = 86400 * 1000000000
+
+# The grid trades from 09:00 to 14:29 and holds positions through the 14:29-14:30 close
+DEFAULT_SESSIONS = (("09:00", "14:29"),)
+DEFAULT_END_OF_DAY = ("14:29", "14:30")
+
+
+def parse_time(value):
+    """
+    Accept a datetime.time or an "HH:MM[:SS]" string
+    """
+    if isinstance(value, time):
+        return value
+    return time.fromisoformat(value)
+
+
+def time_to_us(value):
+    """
+    Microseconds since midnight of a time of day
+    """
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+
+
+def split_day_time(epoch_ns):
+    """
+    Split int64 epoch nanoseconds into int32 dates (days since epoch) and
+    int64 microseconds since midnight
+    """
+    days = (epoch_ns // NS_PER_DAY).astype(np.int32)
+    times = (epoch_ns - days.astype(np.int64) * NS_PER_DAY) // 1000
+    return days, times
+
+
+class SessionCalendar:
+    """
+    Trading session definition of the exchange.
+
+    sessions lists the inclusive (start, end) windows in which the grid may
+    trade, e.g. a morning and an afternoon session around the lunch break;
+    end_of_day is the inclusive window at the close in which equity is
+    marked at cash and, on the last data date, all positions are closed.
+    flags() evaluates all of this for a whole DatetimeIndex at once, so the
+    backtest loops only read booleans by tick index.
+    """
+    def __init__(self, sessions=DEFAULT_SESSIONS, end_of_day=DEFAULT_END_OF_DAY):
+        self.sessions = [(parse_time(start), parse_time(end)) for start, end in sessions]
+        self.end_of_day = (parse_time(end_of_day[0]), parse_time(end_of_day[1]))
+        if not self.sessions:
+            raise ValueError("At least one trading session is required")
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the calendar from the optional session section of config.yaml
+        """
+        section = config.get('session') or {}
+        return cls(section.get('trading', DEFAULT_SESSIONS), section.get('end_of_day', DEFAULT_END_OF_DAY))
+
+    def is_trading_time(self, timestamp):
+        current_time = timestamp.time()
+        return any(start <= current_time <= end for start, end in self.sessions)
+
+    def is_end_of_day(self, timestamp):
+        current_time = timestamp.time()
+        return self.end_of_day[0] <= current_time <= self.end_of_day[1]
+
+    def flags(self, index):
+        """
+        Boolean arrays over the ticks of index: in a trading session, in the
+        end-of-day window, first tick of a new date, and in the final
+        close-out (last data date, from the start of the end-of-day window)
+        """
+        epoch_ns = index.values.astype("datetime64[ns]").view(np.int64)
+        days, times = split_day_time(epoch_ns)
+
+        trading = np.zeros(len(times), dtype=np.bool_)
+        for start, end in self.sessions:
+            trading |= (times >= time_to_us(start)) & (times <= time_to_us(end))
+        end_start, end_close = (time_to_us(value) for value in self.end_of_day)
+        end_of_day = (times >= end_start) & (times <= end_close)
+
+        new_day = np.zeros(len(days), dtype=np.bool_)
+        new_day[1:] = days[1:] != days[:-1]
+        final_close = np.zeros(len(days), dtype=np.bool_)
+        if len(days):
+            final_close = (days == days[-1]) & (times >= end_start)
+        return trading, end_of_day, new_day, final_close
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+
+def share_prices(prices):
+    """
+    Copy a price Series into two shared memory blocks (float64 values and
+    int64 epoch-ns timestamps). Returns the blocks, which the caller must
+    close and unlink when done, and a picklable spec for attach_prices.
+    """
+    arrays = {
+        'values': prices.to_numpy(dtype=np.float64),
+        'timestamps': prices.index.values.astype("datetime64[ns]").view(np.int64),
+    }
+    blocks = []
+    spec = {'length': len(prices), 'name': prices.name}
+    for key, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        spec[key] = block.name
+    return blocks, spec
+
+
+def _attach_block(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers the block, which is
+        # harmless here: pool workers share the creating process's tracker
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_prices(spec):
+    """
+    Rebuild the price Series from shared memory without copying. Returns the
+    Series and the attached blocks, which must stay open while it is in use.
+    """
+    values_block = _attach_block(spec['values'])
+    timestamps_block = _attach_block(spec['timestamps'])
+    length = spec['length']
+    values = np.ndarray((length,), dtype=np.float64, buffer=values_block.buf)
+    timestamps = np.ndarray((length,), dtype=np.int64, buffer=timestamps_block.buf)
+    index = pd.DatetimeIndex(timestamps.view("datetime64[ns]"), copy=False)
+    prices = pd.Series(values, index=index, name=spec['name'], copy=False)
+    return prices, [values_block, timestamps_block]
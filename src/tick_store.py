@@ -0,0 +1,146 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+TICK_STORE_VERSION = 1
+
+# Database timestamps have microsecond resolution, so ranges ending 1us apart are contiguous
+RESOLUTION_NS = 1000
+
+
+class TickStore:
+    """
+    Partitioned on-disk store of fetched ticks.
+
+    Ticks are kept as one pair of .npy files (int64 epoch-ns timestamps,
+    float64 prices) per calendar month, next to a manifest.json listing the
+    inclusive time ranges that have already been fetched. Ranges with no
+    ticks (weekends, holidays) count as fetched too, so only genuinely new
+    periods are requested from the database.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.covered = []
+        self.partitions = {}
+        self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get('version') != TICK_STORE_VERSION:
+            print(f"Ignoring tick store manifest {self.manifest_path} from another version.")
+            return
+        self.covered = [tuple(interval) for interval in manifest['covered']]
+        self.partitions = manifest['partitions']
+
+    def save_manifest(self):
+        manifest = {
+            'version': TICK_STORE_VERSION,
+            'covered': [list(interval) for interval in self.covered],
+            'partitions': self.partitions,
+        }
+        with open(self.manifest_path + ".tmp", 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def partition_paths(self, month):
+        base = os.path.join(self.root, month)
+        return base + ".timestamps.npy", base + ".values.npy"
+
+    def missing_ranges(self, start_date, end_date):
+        """
+        Inclusive (start, end) Timestamp pairs inside [start_date, end_date]
+        that have not been fetched yet
+        """
+        start = pd.Timestamp(start_date).value
+        end = pd.Timestamp(end_date).value
+        gaps = []
+        for covered_start, covered_end in self.covered:
+            if covered_end < start:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > start:
+                gaps.append((start, covered_start - RESOLUTION_NS))
+            start = covered_end + RESOLUTION_NS
+        if start <= end:
+            gaps.append((start, end))
+        return [(pd.Timestamp(gap_start), pd.Timestamp(gap_end)) for gap_start, gap_end in gaps]
+
+    def add(self, prices, start_date, end_date):
+        """
+        Store the ticks fetched for the inclusive range [start_date, end_date]
+        and mark the range as covered
+        """
+        start = pd.Timestamp(start_date).value
+        end = pd.Timestamp(end_date).value
+        timestamps = prices.index.values.astype("datetime64[ns]").view(np.int64)
+        values = prices.to_numpy(dtype=np.float64)
+        inside = (timestamps >= start) & (timestamps <= end)
+        timestamps, values = timestamps[inside], values[inside]
+
+        os.makedirs(self.root, exist_ok=True)
+        months = timestamps.view("datetime64[ns]").astype("datetime64[M]")
+        for month in np.unique(months):
+            in_month = months == month
+            self.write_partition(str(month), timestamps[in_month], values[in_month])
+
+        self.covered = merge_intervals(self.covered + [(start, end)])
+        # The manifest is written last, so an interrupted add is simply fetched again
+        self.save_manifest()
+
+    def write_partition(self, month, timestamps, values):
+        timestamps_path, values_path = self.partition_paths(month)
+        if month in self.partitions:
+            # New ranges never overlap covered ones, so a stable sort merges without duplicates
+            timestamps = np.concatenate([np.load(timestamps_path), timestamps])
+            values = np.concatenate([np.load(values_path), values])
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+        for path, array in ((timestamps_path, timestamps), (values_path, values)):
+            temporary = path[:-len(".npy")] + ".tmp.npy"
+            np.save(temporary, array)
+            os.replace(temporary, path)
+        self.partitions[month] = len(timestamps)
+
+    def load(self, start_date, end_date):
+        """
+        Ticks stored between start_date and end_date (inclusive) as a price
+        Series, or None if there are none
+        """
+        start = pd.Timestamp(start_date).value
+        end = pd.Timestamp(end_date).value
+        first_month = str(np.datetime64(start, "ns").astype("datetime64[M]"))
+        last_month = str(np.datetime64(end, "ns").astype("datetime64[M]"))
+        timestamps, values = [], []
+        for month in sorted(self.partitions):
+            if month < first_month or month > last_month:
+                continue
+            timestamps_path, values_path = self.partition_paths(month)
+            month_timestamps = np.load(timestamps_path, mmap_mode='r')
+            lo = np.searchsorted(month_timestamps, start, side="left")
+            hi = np.searchsorted(month_timestamps, end, side="right")
+            timestamps.append(month_timestamps[lo:hi])
+            values.append(np.load(values_path, mmap_mode='r')[lo:hi])
+        if not timestamps or sum(len(part) for part in timestamps) == 0:
+            return None
+        index = pd.DatetimeIndex(np.concatenate(timestamps).view("datetime64[ns]"), copy=False)
+        return pd.Series(np.concatenate(values), index=index, copy=False)
+
+
+def merge_intervals(intervals):
+    """
+    Sort inclusive (start, end) ns intervals and merge overlapping or adjacent ones
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + RESOLUTION_NS:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
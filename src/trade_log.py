@@ -0,0 +1,121 @@
+import os
+import importlib.util
+from abc import ABC, abstractmethod
+import pandas as pd
+
+LOG_HEADER = ("Trade Log - Dynamic Grid Trading (6 Levels, Size=1, with Take Profit)\n"
+              "Time,Type,Price,Size,Profit,Fee\n")
+
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+class TradeLogSink(ABC):
+    """
+    Destination for trade log records. open() is called at the start of a
+    backtest run, write() once per event and close() at the end of the run.
+    Subclasses must implement write().
+    """
+    path = None
+
+    def open(self):
+        pass
+
+    @abstractmethod
+    def write(self, timestamp, trade_type, price, size, profit=None, fee=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullTradeLogSink(TradeLogSink):
+    """
+    Discards every record, for optimization trials
+    """
+    def write(self, timestamp, trade_type, price, size, profit=None, fee=None):
+        pass
+
+
+class BufferedTradeLogSink(TradeLogSink):
+    """
+    Text trade log that keeps records in memory and appends them to the file
+    every buffer_size records and at the end of the run
+    """
+    def __init__(self, path, buffer_size=1000):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.records = []
+
+    def open(self):
+        self.records = []
+        with open(self.path, "w") as f:
+            f.write(LOG_HEADER)
+
+    def write(self, timestamp, trade_type, price, size, profit=None, fee=None):
+        self.records.append((timestamp, trade_type, price, size, profit, fee))
+        if len(self.records) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.records:
+            return
+        lines = []
+        for timestamp, trade_type, price, size, profit, fee in self.records:
+            profit_str = f"{profit:,.0f}" if profit is not None else "N/A"
+            fee_str = f"{fee:,.0f}" if fee is not None else "N/A"
+            lines.append(f"{timestamp},{trade_type},{price:.1f},{size:.4f},{profit_str},{fee_str}\n")
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+        self.records = []
+
+    def close(self):
+        self.flush()
+
+
+class ColumnarTradeLogSink(TradeLogSink):
+    """
+    Collects records column by column and writes them as a single Parquet or
+    Arrow (Feather) file at the end of the run. Requires pyarrow.
+    """
+    def __init__(self, path, file_format="parquet"):
+        self.path = path
+        self.file_format = file_format
+        self.columns = None
+
+    def open(self):
+        self.columns = {name: [] for name in ("timestamp", "type", "price", "size", "profit", "fee")}
+
+    def write(self, timestamp, trade_type, price, size, profit=None, fee=None):
+        columns = self.columns
+        columns["timestamp"].append(timestamp)
+        columns["type"].append(trade_type)
+        columns["price"].append(price)
+        columns["size"].append(size)
+        columns["profit"].append(float("nan") if profit is None else profit)
+        columns["fee"].append(float("nan") if fee is None else fee)
+
+    def close(self):
+        frame = pd.DataFrame(self.columns)
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+        frame["type"] = frame["type"].astype("category")
+        if self.file_format == "feather":
+            frame.to_feather(self.path)
+        else:
+            frame.to_parquet(self.path, index=False)
+
+
+def create_trade_log_sink(kind, log_file, buffer_size=1000):
+    """
+    Create the trade log sink named by kind ("text", "parquet", "feather" or
+    "none") writing next to log_file. Columnar formats fall back to text when
+    pyarrow is not installed.
+    """
+    if kind == "none":
+        return NullTradeLogSink()
+    if kind in ("parquet", "feather"):
+        if PYARROW_AVAILABLE:
+            return ColumnarTradeLogSink(os.path.splitext(log_file)[0] + f".{kind}", kind)
+        print(f"Warning: pyarrow is not installed, writing a text trade log instead of {kind}.")
+    elif kind != "text":
+        raise ValueError(f"Unknown trade log sink: {kind}")
+    return BufferedTradeLogSink(log_file, buffer_size)
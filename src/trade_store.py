@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+# Event codes stored in TradeStore, indexing into EVENT_NAMES
+BUY, SELL, TAKE_PROFIT_BUY, TAKE_PROFIT_SELL, CLOSE_PAIR, CLOSE_BUY, CLOSE_SELL, TOTAL_FEE, OVERNIGHT_FEE = range(9)
+EVENT_NAMES = ("BUY", "SELL", "TAKE_PROFIT_BUY", "TAKE_PROFIT_SELL", "CLOSE_PAIR", "CLOSE_BUY", "CLOSE_SELL",
+               "TOTAL_FEE", "OVERNIGHT_FEE")
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+
+COLUMN_DTYPES = {
+    'timestamp': np.int64,
+    'event': np.int8,
+    'price': np.float64,
+    'size': np.float64,
+    'profit': np.float64,
+    'fee': np.float64,
+}
+
+
+class TradeStore:
+    """
+    Growable columnar trade history: one typed NumPy array per field
+    (timestamp in epoch ns, event code, price, size, profit, fee), doubled in
+    capacity when full. Iterating yields the same
+    (timestamp, type, price, size, profit, fee) tuples the backtest used to keep.
+    """
+    def __init__(self, capacity=1024):
+        self.count = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        self._frame = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        timestamps = pd.to_datetime(self.column('timestamp'))
+        rows = zip(self.column('event').tolist(), self.column('price').tolist(), self.column('size').tolist(),
+                   self.column('profit').tolist(), self.column('fee').tolist())
+        for timestamp, (code, price, size, profit, fee) in zip(timestamps, rows):
+            yield timestamp, EVENT_NAMES[code], price, size, profit, fee
+
+    def column(self, name):
+        return self.columns[name][:self.count]
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        capacity = len(self.columns['timestamp'])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, values in self.columns.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self.count] = values[:self.count]
+            self.columns[name] = grown
+
+    def append(self, timestamp, trade_type, price, size, profit, fee):
+        self._reserve(1)
+        row = self.count
+        columns = self.columns
+        columns['timestamp'][row] = timestamp.value
+        columns['event'][row] = EVENT_CODES[trade_type]
+        columns['price'][row] = price
+        columns['size'][row] = size
+        columns['profit'][row] = profit
+        columns['fee'][row] = fee
+        self.count += 1
+        self._frame = None
+
+    def extend(self, timestamps, events, prices, sizes, profits, fees):
+        """
+        Append whole arrays at once; timestamps are epoch nanoseconds
+        """
+        extra = len(timestamps)
+        self._reserve(extra)
+        rows = slice(self.count, self.count + extra)
+        for name, values in zip(COLUMN_DTYPES, (timestamps, events, prices, sizes, profits, fees)):
+            self.columns[name][rows] = values
+        self.count += extra
+        self._frame = None
+
+    def opened_volume(self):
+        """
+        Total size of all opened positions
+        """
+        return np.abs(self.column('size')[self.select("BUY", "SELL")]).sum()
+
+    def select(self, *trade_types):
+        """
+        Boolean mask of the stored events whose type is one of trade_types
+        """
+        return np.isin(self.column('event'), [EVENT_CODES[trade_type] for trade_type in trade_types])
+
+    def to_frame(self):
+        """
+        DataFrame view of the history, built on first use and cached until
+        the next append
+        """
+        if self._frame is None:
+            self._frame = pd.DataFrame({
+                'Timestamp': pd.to_datetime(self.column('timestamp')),
+                'Type': pd.Categorical.from_codes(self.column('event'), categories=EVENT_NAMES),
+                'Price': self.column('price'),
+                'Size': self.column('size'),
+                'Profit': self.column('profit'),
+                'Fee': self.column('fee'),
+            })
+        return self._frame
+
+
+class TradeTally:
+    """
+    Stand-in for TradeStore in fast backtests: keeps only the number of
+    recorded events and the opened volume that performance metrics need
+    """
+    def __init__(self):
+        self.count = 0
+        self.volume = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, trade_type, price, size, profit, fee):
+        self.count += 1
+        if trade_type == "BUY" or trade_type == "SELL":
+            self.volume += abs(size)
+
+    def extend(self, timestamps, events, prices, sizes, profits, fees):
+        self.count += len(events)
+        self.volume += np.abs(sizes[(events == BUY) | (events == SELL)]).sum()
+
+    def opened_volume(self):
+        return self.volume
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules in src import each other as top-level modules
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+SAMPLE_FILE = os.path.join(os.path.dirname(SRC), "data", "sample", "vn30_2024.csv")
+
+
+@pytest.fixture(scope="session")
+def sample_prices():
+    """
+    The first ~6 weeks of the sample ticks (weekends and the New Year holiday included)
+    """
+    prices = pd.read_csv(SAMPLE_FILE, header=None, index_col=0, parse_dates=True, nrows=120000).squeeze("columns")
+    return prices.rename_axis("Datetime").rename("Price")
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from logic import DynamicGridBacktest
+
+ENGINES = ("numpy", "events", "numba")
+PARAMETER_SETS = [
+    dict(grid_size_factor=1.47, minimum_grid_size=0.4, move_pivot=6, take_profit_factor=1.0, max_loss=20),
+    # Tight max loss, so forced closes and pivot moves are exercised too
+    dict(grid_size_factor=0.8, minimum_grid_size=0.3, move_pivot=12, take_profit_factor=2.5, max_loss=0.5),
+]
+
+
+@pytest.fixture(scope="module")
+def prices(sample_prices):
+    return sample_prices[(sample_prices.index >= "2024-01-02") & (sample_prices.index < "2024-01-13")]
+
+
+def run(engine, prices, parameters, fast=False):
+    backtest = DynamicGridBacktest(engine=engine, trade_log="none", plot="none", fast=fast, **parameters)
+    days = []
+    metrics = backtest.backtest(prices, progress=lambda date, equity: days.append((date, equity)))
+    return backtest, metrics, days
+
+
+def scalars(metrics):
+    return {key: value for key, value in metrics.items() if np.isscalar(value)}
+
+
+@pytest.fixture(scope="module", params=range(len(PARAMETER_SETS)))
+def reference(request, prices):
+    return PARAMETER_SETS[request.param], run("pandas", prices, PARAMETER_SETS[request.param])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_match_pandas_reference(engine, prices, reference):
+    parameters, (expected, expected_metrics, expected_days) = reference
+    assert len(expected.trade_history) > 0
+    backtest, metrics, days = run(engine, prices, parameters)
+
+    assert [tuple(trade) for trade in backtest.trade_history] == [tuple(trade) for trade in expected.trade_history]
+    np.testing.assert_array_equal(backtest.equity_series.to_numpy(dtype=np.float64),
+                                  expected.equity_series.to_numpy(dtype=np.float64))
+    assert scalars(metrics) == scalars(expected_metrics)
+    np.testing.assert_array_equal(metrics['daily_returns'].to_numpy(), expected_metrics['daily_returns'].to_numpy())
+    assert days == expected_days
+
+
+@pytest.mark.parametrize("engine", ("pandas",) + ENGINES)
+def test_fast_mode_matches_full_run(engine, prices, reference):
+    parameters, (_, expected_metrics, expected_days) = reference
+    backtest, metrics, days = run(engine, prices, parameters, fast=True)
+    assert scalars(metrics) == scalars(expected_metrics)
+    assert days == expected_days
+    assert backtest.equity_series is None
+
+
+def test_print_results_rejects_fast_runs(prices):
+    backtest, metrics, _ = run("numba", prices, PARAMETER_SETS[0], fast=True)
+    with pytest.raises(ValueError):
+        backtest.print_results(metrics=metrics)
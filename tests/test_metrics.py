@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import EQUITY_BLOCK, EquityAccumulator, EquityBlocks, performance_metrics
+
+CONTRACT_VALUE = 100e3
+CAPITAL = 500e6
+OPENED_VOLUME = 37
+
+
+def reference_metrics(equity_series, opened_volume, contract_value, capital):
+    """
+    The original pandas implementation of the metrics
+    (DynamicGridBacktest.calculate_performance_metrics before the rewrite)
+    """
+    equity = equity_series.dropna()
+    hpr = (equity.iloc[-1] / equity.iloc[0] - 1) * 100
+    days = (equity.index[-1] - equity.index[0]).days
+    annual_return = ((1 + hpr / 100) ** (252 / days) - 1) * 100
+    rolling_max = equity.cummax()
+    drawdowns = (equity - rolling_max) / rolling_max * 100
+
+    in_drawdown = drawdowns < 0
+    drawdown_periods = (in_drawdown != in_drawdown.shift(fill_value=False)).cumsum()
+    durations = [(equity.index[drawdown_periods == period][-1] - equity.index[drawdown_periods == period][0]).days
+                 for period in drawdown_periods[in_drawdown].unique()]
+
+    daily_returns = equity_series.dropna().resample('D').last().pct_change().dropna()
+    sharpe_std = daily_returns.std()
+    downside_returns = daily_returns[daily_returns < 0]
+    downside_std = downside_returns.std() if not downside_returns.empty else 0
+    return {
+        'hpr': hpr,
+        'annual_return': annual_return,
+        'max_drawdown': drawdowns.min(),
+        'longest_drawdown': max(durations) if durations else 0,
+        'turnover_ratio': opened_volume * contract_value / capital * 100,
+        'sharpe_ratio': np.sqrt(252) * daily_returns.mean() / sharpe_std if sharpe_std != 0 else 0,
+        'sortino_ratio': np.sqrt(252) * daily_returns.mean() / downside_std if downside_std != 0 else 0,
+        'daily_returns': daily_returns,
+        'final_capital': equity.iloc[-1],
+    }
+
+
+@pytest.fixture
+def equity_series(sample_prices):
+    # A tick-level curve with unmarked (NaN) ticks, as the backtest engines record it
+    equity = sample_prices * 1e6
+    equity.iloc[::7] = np.nan
+    return equity
+
+
+def assert_metrics_match(metrics, expected):
+    for key, value in expected.items():
+        if key == 'daily_returns':
+            pd.testing.assert_series_equal(metrics[key], value, check_names=False, check_freq=False,
+                                           check_index_type=False, rtol=1e-12)
+        else:
+            assert metrics[key] == pytest.approx(value, rel=1e-12), key
+
+
+def test_performance_metrics_match_pandas_reference(equity_series):
+    metrics = performance_metrics(equity_series, OPENED_VOLUME, CONTRACT_VALUE, CAPITAL)
+    assert_metrics_match(metrics, reference_metrics(equity_series, OPENED_VOLUME, CONTRACT_VALUE, CAPITAL))
+
+
+def test_daily_returns_need_the_previous_calendar_day(equity_series):
+    returns = performance_metrics(equity_series, OPENED_VOLUME, CONTRACT_VALUE, CAPITAL)['daily_returns']
+    trading_days = equity_series.dropna().index.normalize().unique()
+    follows_trading_day = trading_days[1:][(trading_days[1:] - trading_days[:-1]).days == 1]
+    assert list(returns.index) == list(follows_trading_day)
+    assert not (returns.index.dayofweek == 0).any()
+
+
+def test_equity_accumulator_matches_performance_metrics(equity_series):
+    expected = performance_metrics(equity_series, OPENED_VOLUME, CONTRACT_VALUE, CAPITAL)
+    values = equity_series.to_numpy(dtype=np.float64)
+    accumulator = EquityAccumulator(1, equity_series.index.values.astype("datetime64[ns]").view(np.int64))
+    for start in range(0, len(values), EQUITY_BLOCK):
+        accumulator.add(values[None, start:start + EQUITY_BLOCK])
+    metrics = accumulator.metrics(0, OPENED_VOLUME * CONTRACT_VALUE / CAPITAL, equity_series.index.name)
+    del expected['equity_series']
+    assert_metrics_match(metrics, expected)
+
+
+def test_equity_blocks_fold_mixed_writes(equity_series):
+    expected = performance_metrics(equity_series, OPENED_VOLUME, CONTRACT_VALUE, CAPITAL)
+    values = equity_series.to_numpy(dtype=np.float64)
+    blocks = EquityBlocks(equity_series.index.values.astype("datetime64[ns]").view(np.int64))
+    # Single ticks and slices of varying length, some of them spanning several blocks
+    i = 0
+    for length in [1, 5, 3 * EQUITY_BLOCK + 17, 1, 700] * 20:
+        stop = min(i + length, len(values))
+        if length == 1:
+            blocks[i] = values[i]
+        else:
+            blocks[i:stop] = values[i:stop]
+        i = stop
+        marked = values[:i][~np.isnan(values[:i])]
+        assert blocks.last_marked(0) == (marked[-1] if len(marked) else None)
+        if i == len(values):
+            break
+    metrics = blocks.metrics(OPENED_VOLUME * CONTRACT_VALUE / CAPITAL, equity_series.index.name)
+    del expected['equity_series']
+    assert_metrics_match(metrics, expected)